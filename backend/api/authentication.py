@@ -0,0 +1,95 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from api.cache import version_key
+
+
+class UserCache:
+    """
+    Process-local LRU cache of authenticated users with a TTL.
+
+    Every entry remembers the shared `auth:<user_id>` version it was
+    loaded with, so an invalidation made by another worker is noticed as
+    long as the Django cache backend is shared between processes.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, user_id, version, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        if cache.get(version_key(f'auth:{user_id}')) != version:
+            self.discard(key)
+            return None
+        return value
+
+    def set(self, key, value, user_id):
+        version = cache.get(version_key(f'auth:{user_id}'))
+        expires = time.monotonic() + self.ttl
+        with self.lock:
+            self.entries[key] = (value, user_id, version, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def discard_user(self, user_id):
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if entry[1] == user_id:
+                    del self.entries[key]
+
+
+user_cache = UserCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД для уже известных токенов."""
+
+    def authenticate_credentials(self, key):
+        cache_key = f'token:{key}'
+        cached = user_cache.get(cache_key)
+        if cached is not None:
+            return copy.copy(cached[0]), cached[1]
+        user, token = super().authenticate_credentials(key)
+        user_cache.set(cache_key, (copy.copy(user), token), user.pk)
+        return user, token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Stateless signed tokens: the signature is checked without the DB and
+    the user is taken from the same cache as for token authentication.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        cache_key = f'jwt:{user_id}'
+        user = user_cache.get(cache_key)
+        if user is not None:
+            return copy.copy(user)
+        user = super().get_user(validated_token)
+        user_cache.set(cache_key, copy.copy(user), user.pk)
+        return user
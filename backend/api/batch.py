@@ -0,0 +1,59 @@
+"""
+Several GET requests to the api inside one POST /api/batch/.
+
+Sub-requests reuse the user authenticated by the batch request and share
+a per-batch cache (see api.utils.batch_related_ids), so a subscription,
+favorite or shopping cart flag needed by several of them is read once.
+"""
+from urllib.parse import urlsplit
+
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+DROPPED_HEADERS = (
+    'CONTENT_LENGTH', 'CONTENT_TYPE',
+    'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE',
+)
+
+
+def make_subrequest(request, url, shared):
+    """GET-запрос с заголовками и пользователем исходного запроса."""
+    path, _, query = url.partition('?')
+    subrequest = HttpRequest()
+    subrequest.method = 'GET'
+    subrequest.path = subrequest.path_info = path
+    subrequest.META = {
+        key: value for key, value in request.META.items()
+        if key not in DROPPED_HEADERS
+    }
+    subrequest.META.update(
+        REQUEST_METHOD='GET', PATH_INFO=path, QUERY_STRING=query)
+    subrequest.GET = QueryDict(query)
+    subrequest.COOKIES = request.COOKIES
+    if request.user.is_authenticated:
+        subrequest._force_auth_user = request.user
+        subrequest._force_auth_token = request.auth
+    subrequest.shared_cache = shared
+    return subrequest
+
+
+def run_subrequest(request, url, shared):
+    try:
+        match = resolve(urlsplit(url).path)
+    except Resolver404:
+        return {'url': url, 'status': NotFound.status_code,
+                'body': {'detail': NotFound.default_detail}}
+    response = match.func(
+        make_subrequest(request, url, shared), *match.args, **match.kwargs)
+    if isinstance(response, Response):
+        body = response.data
+    else:
+        body = response.content.decode(response.charset)
+    return {'url': url, 'status': response.status_code, 'body': body}
+
+
+def run_batch(request, urls):
+    shared = {}
+    return [run_subrequest(request, url, shared) for url in urls]
@@ -0,0 +1,248 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.models import Recipe
+
+VERSION_KEY_PREFIX = 'foodgram:version:'
+RESPONSE_KEY_PREFIX = 'foodgram:response:'
+RECIPES_DELETED_KEY = 'foodgram:recipes:deleted_at'
+RANKINGS_REFRESHED_KEY = 'foodgram:rankings:refreshed_at'
+COUNT_KEY_PREFIX = 'foodgram:count:'
+FACETS_KEY_PREFIX = 'foodgram:facets:'
+RECIPE_CACHE_PARAMS = (
+    'author', 'ordering', 'page', 'limit', 'fields', 'omit', 'ids', 'facets'
+)
+FACETS_IGNORED_PARAMS = (
+    'page', 'limit', 'ordering', 'fields', 'omit', 'facets', 'tags'
+)
+
+
+def version_key(name):
+    return f'{VERSION_KEY_PREFIX}{name}'
+
+
+def get_versions(*names):
+    """
+    Return current values of the version counters.
+
+    A missing counter is seeded with a nanosecond timestamp, so an evicted
+    counter never comes back with a value that was used before. Counters
+    live CACHE_TIMEOUT seconds: with a per-process cache a bump reaches
+    only its own process, the others move on when their counter expires.
+    """
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), settings.CACHE_TIMEOUT)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+class VersionedLocalCache:
+    """
+    Process-local copy of rarely changing data.
+
+    The data is reloaded when its version counter changes or expires
+    (CACHE_TIMEOUT), so the copy is warmed once (before fork, see
+    api.warmup) and then only costs a cache lookup per request.
+    """
+
+    def __init__(self, version_name, load):
+        self.version_name = version_name
+        self.load = load
+        self.version = None
+        self.data = None
+
+    def get(self):
+        version = get_versions(self.version_name)[0]
+        if self.data is None or self.version != version:
+            self.data = self.load()
+            self.version = version
+        return self.data
+
+
+def bump_version(name):
+    """Увеличить счётчик версии, сделав устаревшими зависимые ответы."""
+    key = version_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), settings.CACHE_TIMEOUT)
+
+
+def filter_key(prefix, request, names, ignored_params):
+    """
+    Key of a value computed for the filter parameters of the request,
+    outdated when one of the version counters `names` moves.
+    """
+    params = sorted(
+        (name, sorted(request.query_params.getlist(name)))
+        for name in request.query_params
+        if name not in ignored_params
+    )
+    raw = repr((request.path, params, names, get_versions(*names)))
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'{prefix}{digest}'
+
+
+def normalize_recipe_params(request):
+    """Query-параметры, от которых зависит ответ анонимному юзеру."""
+    params = [('tags', sorted(set(request.query_params.getlist('tags'))))]
+    params.extend(
+        (name, request.query_params.get(name, ''))
+        for name in RECIPE_CACHE_PARAMS
+    )
+    return params
+
+
+def recipe_list_key(request, **kwargs):
+    versions = get_versions('recipes', 'tag', 'ingredient', 'user')
+    return make_response_key(request, 'list', versions)
+
+
+def recipe_detail_key(request, pk, **kwargs):
+    versions = get_versions(f'recipe:{pk}', 'tag', 'ingredient', 'user')
+    return make_response_key(request, f'detail:{pk}', versions)
+
+
+def make_response_key(request, kind, versions):
+    raw = repr((
+        request.get_host(), normalize_recipe_params(request), versions
+    ))
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'{RESPONSE_KEY_PREFIX}{kind}:{digest}'
+
+
+def restore_link(request, link):
+    """Перенести номер страницы из закешированной ссылки в текущий URL."""
+    if link is None:
+        return None
+    url = request.build_absolute_uri()
+    page = parse_qs(urlparse(link).query).get('page')
+    if page:
+        return replace_query_param(url, 'page', page[0])
+    return remove_query_param(url, 'page')
+
+
+def restore_links(request, data):
+    """
+    Pagination links of a cached page are rebuilt from the current URL:
+    the key ignores query parameters that do not change the results.
+    """
+    if isinstance(data, dict) and 'next' in data:
+        data['next'] = restore_link(request, data['next'])
+        data['previous'] = restore_link(request, data['previous'])
+    return data
+
+
+def cache_for_anonymous(make_key):
+    """
+    Cache successful GET responses for anonymous users.
+
+    The key is built before the view runs, so data read after a concurrent
+    write is stored under a version that is already outdated.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return method(self, request, *args, **kwargs)
+            key = make_key(request, **kwargs)
+            data = cache.get(key)
+            if data is not None:
+                return Response(restore_links(request, data))
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, settings.CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def mark_recipes_deleted():
+    """Удаление не оставляет updated_at, поэтому время хранится в кеше."""
+    cache.set(RECIPES_DELETED_KEY, timezone.now(), None)
+
+
+def mark_rankings_refreshed():
+    cache.set(RANKINGS_REFRESHED_KEY, timezone.now(), None)
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def recipe_list_validators(view, request, **kwargs):
+    """ETag и Last-Modified списка рецептов одним агрегирующим запросом."""
+    stats = view.filter_queryset(Recipe.objects.all()).aggregate(
+        last_modified=Max('updated_at'), count=Count('pk'))
+    changed_at = [stats['last_modified'], cache.get(RECIPES_DELETED_KEY)]
+    if request.query_params.get('ordering'):
+        changed_at.append(cache.get(RANKINGS_REFRESHED_KEY))
+    last_modified = max(filter(None, changed_at), default=None)
+    if last_modified is None:
+        return None, None
+    etag = make_etag(
+        'list', normalize_recipe_params(request), last_modified.isoformat(),
+        stats['count'])
+    return etag, last_modified
+
+
+def recipe_detail_validators(view, request, pk, **kwargs):
+    if not pk.isdigit():
+        return None, None
+    last_modified = (
+        view.filter_queryset(Recipe.objects.filter(pk=pk))
+        .values_list('updated_at', flat=True).first()
+    )
+    if last_modified is None:
+        return None, None
+    return make_etag('detail', pk, last_modified.isoformat()), last_modified
+
+
+def conditional_for_anonymous(get_validators, make_key):
+    """
+    Answer If-None-Match / If-Modified-Since for anonymous GETs.
+
+    Responses for authenticated users carry per-user flags that do not
+    change updated_at, so they are left without validators. Validators
+    are cached next to the response, under the key of cache_for_anonymous:
+    a cache hit then costs no query.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return method(self, request, *args, **kwargs)
+            key = f'{make_key(request, **kwargs)}:validators'
+            validators = cache.get(key)
+            if validators is None:
+                validators = get_validators(self, request, **kwargs)
+                cache.set(key, validators, settings.CACHE_TIMEOUT)
+            etag, last_modified = validators
+            if etag is None:
+                return method(self, request, *args, **kwargs)
+            timestamp = int(last_modified.timestamp())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(timestamp)
+                patch_vary_headers(response, ('Authorization',))
+            return response
+        return wrapper
+    return decorator
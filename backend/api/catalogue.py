@@ -0,0 +1,21 @@
+from api.cache import VersionedLocalCache
+from api.serializers import IngredientSerializer, TagSerializer
+from recipes.models import Ingredient, Tag
+
+
+def load_tags():
+    return list(TagSerializer(Tag.objects.all(), many=True).data)
+
+
+def load_ingredients():
+    """Ингредиенты вместе с названием в нижнем регистре для поиска."""
+    return [
+        (ingredient['name'].lower(), ingredient)
+        for ingredient in IngredientSerializer(
+            Ingredient.objects.all(), many=True).data
+    ]
+
+
+tag_catalogue = VersionedLocalCache('tag', load_tags)
+
+ingredient_catalogue = VersionedLocalCache('ingredient', load_ingredients)
@@ -0,0 +1,160 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from api.authentication import user_cache
+from api.cache import (bump_version, mark_rankings_refreshed,
+                       mark_recipes_deleted)
+from recipes.constants import CHANGES_BATCH_SIZE, CHANGES_PRUNE_BATCH_SIZE
+from recipes.models import Change
+
+
+def latest_cursor():
+    return Change.objects.aggregate(cursor=Max('pk'))['cursor'] or 0
+
+
+def oldest_cursor():
+    """Курсор, начиная с которого журнал полон: более ранние удалены."""
+    pk = Change.objects.order_by('pk').values_list('pk', flat=True).first()
+    return pk - 1 if pk else 0
+
+
+def prune_changes():
+    """
+    Delete events older than CHANGES_KEEP_DAYS in batches, oldest first.
+
+    The latest event is always kept, so the cursor never moves back.
+    """
+    horizon = timezone.now() - timedelta(days=settings.CHANGES_KEEP_DAYS)
+    latest = latest_cursor()
+    deleted = 0
+    while True:
+        ids = list(
+            Change.objects.filter(pk__lt=latest, created_at__lt=horizon)
+            .order_by('pk').values_list('pk', flat=True)
+            [:CHANGES_PRUNE_BATCH_SIZE]
+        )
+        if not ids:
+            return deleted
+        deleted += Change.objects.filter(pk__in=ids).delete()[0]
+
+
+def read_changes(since, limit=CHANGES_BATCH_SIZE):
+    """
+    Events after the cursor as (changes, cursor, has_more), each one
+    a (pk, kind, object_id, deleted, owner_id, created) tuple: the pk is
+    the cursor right after the event.
+
+    Ids are handed out before commit, so a missing id may belong to a
+    transaction still in flight: reading stops at such a gap unless the
+    next event is older than CHANGES_DELAY, then the gap is taken for a
+    rollback. The cursor therefore never skips a committed event of a
+    transaction shorter than CHANGES_DELAY.
+    """
+    rows = list(
+        Change.objects.filter(pk__gt=since).order_by('pk').values_list(
+            'pk', 'created_at', 'kind', 'object_id', 'deleted', 'owner_id',
+            'created'
+        )[:limit]
+    )
+    horizon = timezone.now() - timedelta(seconds=settings.CHANGES_DELAY)
+    changes = []
+    cursor = since
+    for pk, created_at, *change in rows:
+        if pk != cursor + 1 and created_at > horizon:
+            return changes, cursor, False
+        changes.append((pk, *change))
+        cursor = pk
+    return changes, cursor, len(rows) == limit
+
+
+def compact(changes, user):
+    """
+    Последнее событие на объект; чужие личные и служебные события
+    отбрасываются.
+    """
+    latest = {}
+    for pk, kind, object_id, deleted, owner_id, created in changes:
+        if kind in (Change.RANKING, Change.TOKEN):
+            continue
+        if owner_id is not None and owner_id != user.pk:
+            continue
+        latest.pop((kind, object_id), None)
+        latest[kind, object_id] = deleted
+    return [
+        {'type': kind, 'id': object_id, 'deleted': deleted}
+        for (kind, object_id), deleted in latest.items()
+    ]
+
+
+def change_versions(kind, object_id, owner_id):
+    """Версии кеша, которые затрагивает событие."""
+    if kind == Change.RECIPE:
+        return 'recipes', f'recipe:{object_id}'
+    if kind in (Change.TAG, Change.INGREDIENT):
+        return 'recipes', kind
+    if kind == Change.USER:
+        return 'user', f'auth:{object_id}'
+    if kind == Change.TOKEN:
+        return f'auth:{object_id}',
+    if kind == Change.RANKING:
+        return 'recipes',
+    return f'{kind}:{owner_id}',
+
+
+def invalidate(changes):
+    """Увеличить версии кеша, которые затрагивают события."""
+    names = set()
+    recipes_deleted = rankings_changed = False
+    for pk, kind, object_id, deleted, owner_id, created in changes:
+        names.update(change_versions(kind, object_id, owner_id))
+        if kind in (Change.USER, Change.TOKEN):
+            user_cache.discard_user(object_id)
+        recipes_deleted = recipes_deleted or (
+            kind == Change.RECIPE and deleted)
+        rankings_changed = rankings_changed or kind == Change.RANKING
+    for name in names:
+        bump_version(name)
+    if recipes_deleted:
+        mark_recipes_deleted()
+    if rankings_changed:
+        mark_rankings_refreshed()
+
+
+class ChangeListener:
+    """
+    Replay the change log into the cache versions of this process.
+
+    With a process-local cache backend a version bumped by one worker is
+    never seen by the others; polling the log at most every
+    CHANGES_POLL_INTERVAL seconds brings them up to date.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.cursor = None
+        self.next_poll = 0
+        self.lock = threading.Lock()
+
+    def poll(self):
+        now = time.monotonic()
+        if now < self.next_poll or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.next_poll = now + self.interval
+            if self.cursor is None:
+                self.cursor = latest_cursor()
+                return
+            has_more = True
+            while has_more:
+                changes, self.cursor, has_more = read_changes(self.cursor)
+                invalidate(changes)
+        finally:
+            self.lock.release()
+
+
+change_listener = ChangeListener(settings.CHANGES_POLL_INTERVAL)
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core import checks
+from rest_framework.settings import api_settings
+
+
+@checks.register()
+def check_throttle_cache(app_configs, **kwargs):
+    """Ведро токенов атомарно обновляет только скрипт в Redis."""
+    if not settings.REDIS_CACHE and api_settings.DEFAULT_THROTTLE_RATES.get(
+            'cost'):
+        return [checks.Error(
+            'THROTTLE_RATE needs the Redis cache shared by all workers.',
+            hint='Set CACHE_BACKEND to django_redis.cache.RedisCache, or '
+                 'leave THROTTLE_RATE empty.',
+            id='api.E001',
+        )]
+    return []
+
+
+@checks.register()
+def check_replica_cache(app_configs, **kwargs):
+    """Флаг чтения своих записей должен быть виден всем воркерам."""
+    if settings.LOCAL_CACHE and settings.DATABASE_REPLICAS:
+        return [checks.Error(
+            'DB_REPLICAS needs a cache shared by all workers.',
+            hint='Set CACHE_BACKEND to Redis or Memcached: after a write '
+                 'the next read may land on another worker.',
+            id='api.E002',
+        )]
+    return []
@@ -0,0 +1,288 @@
+"""
+Server-sent events: GET /api/events/.
+
+The stream is served by its own ASGI service (`events` in
+infra/docker-compose.production.yml, ASGI=True); the api stays on the
+threaded WSGI workers, since the ASGI handler of Django 3.2 runs sync
+views one at a time per worker.
+
+One EventHub per process reads the change log and publishes what it
+finds to a local broker, so the database is polled once per process
+however many streams are open. Channels are `user:<id>` (own favorites,
+shopping cart and subscriptions) and `author:<id>` (new recipes); a
+stream listens to its user channel and to the channels of the authors
+it follows. The broker is EVENTS_BROKER, any class with subscribe,
+unsubscribe and publish will do.
+
+Every event carries the id of its change log row as its SSE id: after
+a reconnect /api/changes/?since=<id> returns what was missed, events of
+the same batch included.
+"""
+import asyncio
+import io
+import json
+import logging
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DatabaseError, close_old_connections
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import (APIException, MethodNotAllowed,
+                                       NotAuthenticated)
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from api.changes import latest_cursor, read_changes
+from recipes.constants import EVENTS_QUEUE_SIZE, EVENTS_RETRY
+from recipes.models import Change, Recipe
+from users.models import Subscription
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PATH = '/api/events/'
+
+USER_EVENTS = (Change.FAVORITE, Change.SHOPPING_CART, Change.SUBSCRIPTION)
+
+
+class LocalBroker:
+    """In-process pub/sub: a channel is a set of subscribers."""
+
+    def __init__(self):
+        self.channels = defaultdict(set)
+
+    def subscribe(self, channel, subscriber):
+        self.channels[channel].add(subscriber)
+
+    def unsubscribe(self, channel, subscriber):
+        subscribers = self.channels.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.channels[channel]
+
+    def publish(self, channel, event):
+        for subscriber in tuple(self.channels.get(channel, ())):
+            subscriber.send(event)
+
+
+class Subscriber:
+    """
+    Очередь событий одного потока. Если клиент не успевает читать,
+    поток закрывается: он догонит пропущенное через /api/changes/.
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue(EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def send(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+def route(changes):
+    """События журнала как пары (канал, событие)."""
+    created = [
+        object_id
+        for pk, kind, object_id, deleted, owner_id, is_created in changes
+        if kind == Change.RECIPE and is_created
+    ]
+    authors = {}
+    if created:
+        authors = dict(
+            Recipe.objects.filter(pk__in=created)
+            .values_list('pk', 'author_id')
+        )
+    events = []
+    for pk, kind, object_id, deleted, owner_id, is_created in changes:
+        if kind in USER_EVENTS:
+            events.append((f'user:{owner_id}', {
+                'cursor': pk, 'type': kind,
+                'id': object_id, 'deleted': deleted,
+            }))
+        elif is_created and object_id in authors:
+            events.append((f'author:{authors[object_id]}', {
+                'cursor': pk, 'type': kind,
+                'id': object_id, 'author': authors[object_id],
+            }))
+    return events
+
+
+class EventHub:
+    """
+    Replay the change log into the broker while streams are open.
+
+    With no streams the hub stops; the next one starts it again from
+    the latest cursor.
+    """
+
+    def __init__(self, broker, interval):
+        self.broker = broker
+        self.interval = interval
+        self.streams = 0
+        self.task = None
+
+    def connect(self):
+        self.streams += 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def disconnect(self):
+        self.streams -= 1
+
+    def read(self, cursor):
+        close_old_connections()
+        if cursor is None:
+            return [], latest_cursor()
+        events = []
+        has_more = True
+        while has_more:
+            changes, cursor, has_more = read_changes(cursor)
+            events.extend(route(changes))
+        return events, cursor
+
+    async def run(self):
+        cursor = None
+        while self.streams > 0:
+            try:
+                events, cursor = await sync_to_async(self.read)(cursor)
+            except DatabaseError:
+                logger.exception('Журнал изменений недоступен')
+                events = []
+            for channel, event in events:
+                self.broker.publish(channel, event)
+            await asyncio.sleep(self.interval)
+
+
+hub = EventHub(
+    import_string(settings.EVENTS_BROKER)(), settings.CHANGES_POLL_INTERVAL)
+
+
+def open_stream(scope):
+    """
+    Authenticate the request like the api does and return the user id
+    with the ids of the authors the user follows.
+    """
+    close_old_connections()
+    request = Request(
+        ASGIRequest(scope, io.BytesIO()),
+        authenticators=[
+            authentication()
+            for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ],
+    )
+    user = request.user
+    if not user.is_authenticated:
+        raise NotAuthenticated()
+    return user.pk, list(
+        Subscription.objects.filter(user=user)
+        .values_list('author_id', flat=True)
+    )
+
+
+def format_event(event):
+    data = {key: value for key, value in event.items() if key != 'cursor'}
+    return (
+        f'id: {event["cursor"]}\n'
+        f'event: {event["type"]}\n'
+        f'data: {json.dumps(data)}\n\n'
+    ).encode()
+
+
+async def send_json(send, status, data):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps(data, ensure_ascii=False).encode(),
+    })
+
+
+async def event_stream(scope, receive, send):
+    """ASGI-приложение потока событий текущего пользователя."""
+    try:
+        if scope['method'] != 'GET':
+            raise MethodNotAllowed(scope['method'])
+        user_id, authors = await sync_to_async(open_stream)(scope)
+    except APIException as error:
+        await send_json(send, error.status_code, {'detail': error.detail})
+        return
+    subscriber = Subscriber()
+    channels = {f'user:{user_id}', *(f'author:{pk}' for pk in authors)}
+    for channel in channels:
+        hub.broker.subscribe(channel, subscriber)
+    hub.connect()
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': f'retry: {EVENTS_RETRY}\n\n'.encode(),
+            'more_body': True,
+        })
+        await stream_events(receive, send, subscriber, channels)
+    finally:
+        hub.disconnect()
+        for channel in channels:
+            hub.broker.unsubscribe(channel, subscriber)
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_events(receive, send, subscriber, channels):
+    """Отправлять события, пока клиент не отключится."""
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        while not subscriber.overflowed:
+            get = asyncio.ensure_future(subscriber.queue.get())
+            done, _ = await asyncio.wait(
+                (get, disconnected), timeout=settings.EVENTS_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                get.cancel()
+                return
+            if get not in done:
+                get.cancel()
+                body = b': keepalive\n\n'
+            else:
+                event = get.result()
+                follow(subscriber, channels, event)
+                body = format_event(event)
+            await send({
+                'type': 'http.response.body', 'body': body,
+                'more_body': True,
+            })
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+
+
+def follow(subscriber, channels, event):
+    """Подписка с другого устройства меняет каналы потока."""
+    if event['type'] != Change.SUBSCRIPTION:
+        return
+    channel = f'author:{event["id"]}'
+    if event['deleted']:
+        channels.discard(channel)
+        hub.broker.unsubscribe(channel, subscriber)
+    else:
+        channels.add(channel)
+        hub.broker.subscribe(channel, subscriber)
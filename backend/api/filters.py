@@ -1,5 +1,7 @@
+from django.db.models import F
 from django_filters.rest_framework import FilterSet, filters
 
+from api.utils import parse_ids
 from recipes.models import Ingredient, Recipe, Tag
 
 
@@ -27,11 +29,17 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'popular'), ('trending', 'trending')),
+        method='get_ordering'
+    )
+    ids = filters.CharFilter(method='get_ids')
 
     class Meta:
         model = Recipe
         fields = (
-            'tags', 'author', 'is_favorited', 'is_in_shopping_cart'
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+            'ordering', 'ids'
         )
 
     def get_is_favorited(self, queryset, name, value):
@@ -45,3 +53,12 @@ class RecipeFilter(FilterSet):
             return queryset.filter(
                 recipes_shoppingcart_related__user=self.request.user)
         return queryset
+
+    def get_ordering(self, queryset, name, value):
+        """Готовые оценки из RecipeRanking, без рейтинга — в конце."""
+        return queryset.order_by(
+            F(f'ranking__{value}').desc(nulls_last=True), '-pub_date')
+
+    def get_ids(self, queryset, name, value):
+        """Рецепты по списку ?ids=1,2,3 — для подгрузки без пагинации."""
+        return queryset.filter(pk__in=parse_ids(self.request, name))
@@ -0,0 +1,8 @@
+from datetime import timedelta
+
+from api.changes import prune_changes
+from jobs.queue import job
+from recipes.constants import CHANGES_PRUNE_HOURS
+
+job('api.prune_changes',
+    periodic=timedelta(hours=CHANGES_PRUNE_HOURS))(prune_changes)
@@ -0,0 +1,44 @@
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a running server with concurrent GET requests; run it once '
+        'against the WSGI and once against the ASGI deployment.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', nargs='+')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--token', help='Токен для заголовка Authorization')
+
+    def fetch(self, url, headers):
+        start = perf_counter()
+        with urlopen(Request(url, headers=headers)) as response:
+            response.read()
+        return perf_counter() - start
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        for url in options['url']:
+            with ThreadPoolExecutor(options['concurrency']) as executor:
+                start = perf_counter()
+                latencies = sorted(executor.map(
+                    lambda _: self.fetch(url, headers),
+                    range(options['requests'])))
+                elapsed = perf_counter() - start
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            self.stdout.write(
+                f'{url}: {len(latencies) / elapsed:.1f} запр/с, '
+                f'p50 {statistics.median(latencies) * 1000:.1f} мс, '
+                f'p95 {p95 * 1000:.1f} мс'
+            )
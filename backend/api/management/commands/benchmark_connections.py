@@ -0,0 +1,53 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+
+class Command(BaseCommand):
+    help = 'Per-request cost without and with persistent/pooled connections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--path', default='/api/tags/')
+
+    def measure(self, client, path, requests):
+        connection.close()
+        client.get(path)
+        start = perf_counter()
+        for _ in range(requests):
+            response = client.get(path)
+        if response.status_code != 200:
+            self.stdout.write(self.style.WARNING(
+                f'{path} ответил {response.status_code}'))
+        return (perf_counter() - start) / requests * 1000
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        original = dict(settings_dict)
+        modes = [
+            ('CONN_MAX_AGE=0', {'CONN_MAX_AGE': 0, 'POOL_SIZE': 0}),
+            (
+                f'CONN_MAX_AGE={original["CONN_MAX_AGE"] or 60}',
+                {'CONN_MAX_AGE': original['CONN_MAX_AGE'] or 60,
+                 'POOL_SIZE': 0}
+            ),
+        ]
+        if hasattr(connection, 'pool'):
+            modes.append(
+                ('CONN_MAX_AGE=0, POOL_SIZE=1',
+                 {'CONN_MAX_AGE': 0, 'POOL_SIZE': 1}))
+        client = Client()
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                for label, overrides in modes:
+                    settings_dict.update(overrides)
+                    cost = self.measure(
+                        client, options['path'], options['requests'])
+                    self.stdout.write(f'{label:<30} {cost:8.2f} мс/запрос')
+        finally:
+            connection.close()
+            settings_dict.clear()
+            settings_dict.update(original)
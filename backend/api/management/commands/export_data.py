@@ -0,0 +1,38 @@
+import os
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.transfer import TABLES, TRANSFER_CHUNK_SIZE, export_table
+
+
+class Command(BaseCommand):
+    help = 'Export users, recipes and their relations to NDJSON files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument(
+            '--chunk-size', type=int, default=TRANSFER_CHUNK_SIZE)
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Export tables in parallel processes.')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        os.makedirs(directory, exist_ok=True)
+        jobs = [
+            (table.name, directory, options['chunk_size'])
+            for table in TABLES
+        ]
+        if options['processes'] > 1:
+            # Процессы открывают свои соединения, унаследованные закрыты.
+            connections.close_all()
+            with Pool(options['processes']) as pool:
+                counts = pool.starmap(export_table, jobs)
+        else:
+            counts = [export_table(*job) for job in jobs]
+        for table, count in zip(TABLES, counts):
+            self.stdout.write(f'{table.name}: {count}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Данные выгружены в {directory}'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import bump_version
+from api.transfer import TRANSFER_CHUNK_SIZE, ImportConflict, import_dataset
+
+
+class Command(BaseCommand):
+    help = 'Import NDJSON files written by export_data, resuming if needed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument(
+            '--chunk-size', type=int, default=TRANSFER_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            import_dataset(
+                options['directory'], options['chunk_size'],
+                self.stdout.write)
+        except ImportConflict as error:
+            raise CommandError(
+                f'{error}; исправьте данные и запустите импорт снова')
+        for name in ('recipes', 'tag', 'ingredient', 'user'):
+            bump_version(name)
+        self.stdout.write(self.style.SUCCESS(
+            'Данные загружены; пересчитайте rebuild_similar и '
+            'refresh_rankings'))
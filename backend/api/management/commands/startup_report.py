@@ -0,0 +1,53 @@
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+STARTUP_SCRIPT = (
+    'import django; django.setup(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns'
+)
+
+
+class Command(BaseCommand):
+    help = 'Import time of every installed app during startup.'
+
+    def import_times(self):
+        """Собственное время импорта модулей в свежем интерпретаторе, мкс."""
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+            capture_output=True, text=True, cwd=settings.BASE_DIR,
+            check=True,
+        )
+        times = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            self_time, _, module = line[len('import time:'):].split('|')
+            if self_time.strip().isdigit():
+                times[module.strip()] = int(self_time)
+        return times
+
+    def handle(self, *args, **options):
+        times = self.import_times()
+        names = sorted(
+            (app_config.name for app_config in apps.get_app_configs()),
+            key=len, reverse=True)
+        per_app = defaultdict(int)
+        for module, self_time in times.items():
+            for name in names:
+                if module == name or module.startswith(f'{name}.'):
+                    per_app[name] += self_time
+                    break
+        total = sum(times.values())
+        for name, self_time in sorted(
+                per_app.items(), key=lambda item: item[1], reverse=True):
+            self.stdout.write(f'{name:<40} {self_time / 1000:8.1f} мс')
+        other = total - sum(per_app.values())
+        self.stdout.write(
+            f'{"Django и прочие зависимости":<40} {other / 1000:8.1f} мс')
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Все импорты":<40} {total / 1000:8.1f} мс'))
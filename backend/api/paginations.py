@@ -1,6 +1,102 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
 
+from api.cache import COUNT_KEY_PREFIX, filter_key
+
+
+class CountingPaginator(Paginator):
+    """Paginator that takes the number of objects from `get_count`."""
+
+    def __init__(self, object_list, per_page, get_count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.get_count = get_count
+
+    @cached_property
+    def count(self):
+        if self.get_count is None:
+            return super().count
+        return self.get_count(self.object_list)
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк из плана PostgreSQL или None на других СУБД.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
 
 class CustomPagination(PageNumberPagination):
+    """
+    Page number pagination with a cached `count`.
+
+    A view opts in with `get_count_versions(request)`, which names the
+    version counters its results depend on. The count is then cached per
+    path and filter parameters (page and page size do not change it) until
+    one of the counters moves. Above PAGINATION_COUNT_THRESHOLD rows, as
+    estimated by the planner, the estimate is used instead of COUNT and
+    the response carries `count_is_approximate`.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    ignored_count_params = (
+        'page', 'limit', 'ordering', 'fields', 'omit', 'recipes_limit',
+        'facets'
+    )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.approximate = False
+        self.count_key = self.get_count_key(request, view)
+        self.django_paginator_class = lambda object_list, per_page: (
+            CountingPaginator(object_list, per_page, self.get_count))
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count_key(self, request, view):
+        get_versions_names = getattr(view, 'get_count_versions', None)
+        if get_versions_names is None:
+            return None
+        return filter_key(
+            COUNT_KEY_PREFIX, request, get_versions_names(request),
+            self.ignored_count_params)
+
+    def get_count(self, object_list):
+        if not isinstance(object_list, QuerySet):
+            return len(object_list)
+        if self.count_key is not None:
+            cached = cache.get(self.count_key)
+            if cached is not None:
+                count, self.approximate = cached
+                return count
+        count = estimate_count(object_list)
+        self.approximate = (
+            count is not None
+            and count > settings.PAGINATION_COUNT_THRESHOLD
+        )
+        if not self.approximate:
+            count = object_list.count()
+        if self.count_key is not None:
+            cache.set(
+                self.count_key, (count, self.approximate),
+                settings.CACHE_TIMEOUT)
+        return count
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.approximate:
+            response.data['count_is_approximate'] = True
+        return response
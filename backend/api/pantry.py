@@ -0,0 +1,145 @@
+import threading
+from array import array
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+
+from api.cache import RECIPES_DELETED_KEY, get_versions
+from recipes.models import Recipe
+from recipes.similarity import load_features
+
+PANTRY_INDEX_OVERLAP = timedelta(seconds=60)
+
+
+class PantryIndex:
+    """
+    Process-local inverted index ingredient -> recipe slots.
+
+    A changed recipe gets a new slot and its old slot is marked dead, so
+    the posting lists are only appended to; the index is loaded again
+    from scratch once dead slots outnumber live ones. Changes are picked
+    up by `updated_at` when the shared `recipes` version moves.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.version = None
+        self.watermark = None
+        self.deleted_at = None
+        self.recipe_ids = array('q')
+        self.totals = array('i')
+        self.cooking_times = array('i')
+        self.alive = bytearray()
+        self.slots = {}
+        self.updated = {}
+        self.postings = defaultdict(lambda: array('i'))
+        self.tag_postings = defaultdict(lambda: array('i'))
+
+    def add(self, recipe_id, cooking_time, ingredients, tags):
+        self.remove(recipe_id)
+        slot = len(self.recipe_ids)
+        self.slots[recipe_id] = slot
+        self.recipe_ids.append(recipe_id)
+        self.totals.append(len(ingredients))
+        self.cooking_times.append(cooking_time)
+        self.alive.append(1)
+        for ingredient_id in ingredients:
+            self.postings[ingredient_id].append(slot)
+        for tag_id in tags:
+            self.tag_postings[tag_id].append(slot)
+
+    def remove(self, recipe_id):
+        slot = self.slots.pop(recipe_id, None)
+        if slot is not None:
+            self.alive[slot] = 0
+            del self.updated[recipe_id]
+
+    def load(self, queryset, full=False):
+        """Добавить рецепты queryset, пропуская уже известные версии."""
+        rows = [
+            row for row in queryset.order_by('pk').values_list(
+                'pk', 'cooking_time', 'updated_at')
+            if self.updated.get(row[0]) != row[2]
+        ]
+        ingredients, tags = load_features(
+            None if full else [row[0] for row in rows])
+        for recipe_id, cooking_time, updated_at in rows:
+            self.add(recipe_id, cooking_time,
+                     ingredients[recipe_id], tags[recipe_id])
+            self.updated[recipe_id] = updated_at
+            if self.watermark is None or updated_at > self.watermark:
+                self.watermark = updated_at
+
+    def refresh(self):
+        """Подтянуть изменения, если версия рецептов сменилась."""
+        version = get_versions('recipes')[0]
+        with self.lock:
+            if version == self.version:
+                return
+            deleted_at = cache.get(RECIPES_DELETED_KEY)
+            if (self.watermark is None
+                    or len(self.alive) > 2 * len(self.slots)):
+                self.reset()
+                self.load(Recipe.objects.all(), full=True)
+            else:
+                self.load(Recipe.objects.filter(
+                    updated_at__gte=self.watermark - PANTRY_INDEX_OVERLAP))
+                if deleted_at != self.deleted_at:
+                    existing = set(
+                        Recipe.objects.values_list('pk', flat=True))
+                    for recipe_id in self.slots.keys() - existing:
+                        self.remove(recipe_id)
+            self.deleted_at = deleted_at
+            self.version = version
+
+    def search(self, ingredient_ids, tag_ids=None, max_cooking_time=None):
+        """
+        Recipes sharing an ingredient with the pantry as
+        (recipe_id, matched, total) sorted by coverage matched / total,
+        then by matched ingredients, then newest first.
+        """
+        self.refresh()
+        with self.lock:
+            size = len(self.recipe_ids)
+            postings = [
+                np.frombuffer(self.postings[ingredient_id], dtype=np.int32)
+                for ingredient_id in ingredient_ids
+                if ingredient_id in self.postings
+            ]
+            if not postings:
+                return []
+            matched = np.bincount(np.concatenate(postings), minlength=size)
+            # Views over the arrays must not outlive the lock: an array
+            # exporting its buffer cannot be appended to.
+            del postings
+            mask = (matched > 0) & np.frombuffer(self.alive, dtype=np.bool_)
+            if tag_ids is not None:
+                tagged = np.zeros(size, dtype=np.bool_)
+                for tag_id in tag_ids:
+                    if tag_id in self.tag_postings:
+                        tagged[np.frombuffer(
+                            self.tag_postings[tag_id], dtype=np.int32)] = True
+                mask &= tagged
+            if max_cooking_time is not None:
+                mask &= (
+                    np.frombuffer(self.cooking_times, dtype=np.int32)
+                    <= max_cooking_time
+                )
+            slots = np.flatnonzero(mask)
+            matched = matched[slots]
+            totals = np.frombuffer(self.totals, dtype=np.int32)[slots]
+            recipe_ids = np.frombuffer(self.recipe_ids, dtype=np.int64)[slots]
+        order = np.lexsort((-recipe_ids, -matched, -matched / totals))
+        return list(zip(
+            recipe_ids[order].tolist(),
+            matched[order].tolist(),
+            totals[order].tolist(),
+        ))
+
+
+pantry_index = PantryIndex()
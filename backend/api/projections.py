@@ -0,0 +1,170 @@
+from django.db.models import F, TextField
+from django.db.models.fields.json import KeyTextTransform, KeyTransform
+
+from api.utils import batch_related_ids, parse_fields
+from recipes.documents import (AUTHOR_FIELDS, INGREDIENT_FIELDS, TAG_FIELDS,
+                               repair_documents)
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+RECIPE_FIELDS = (
+    'id', 'tags', 'author', 'ingredients', 'is_favorited',
+    'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+)
+
+DOCUMENT_KEYS = (
+    'id', 'tags', 'author', 'ingredients', 'name', 'image', 'text',
+    'cooking_time',
+)
+
+# Строки читаются как текст: значение KeyTransform с полем JSONField
+# на SQLite раскодируется ещё раз, и название '123' стало бы числом.
+TEXT_KEYS = ('name', 'image', 'text')
+
+
+class RecipeProjection:
+    """
+    Read path for recipes built from precomputed recipe documents.
+
+    Produces the same JSON shape as RecipeReadSerializer: the page query
+    brings the RecipeDocument of every row, only the per-user flags are
+    queried on top. Only the document keys of the fields asked for with
+    ?fields= / ?omit= are selected, and flags left out are not queried.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+        self.storage = Recipe._meta.get_field('image').storage
+        self.fields = parse_fields(request, RECIPE_FIELDS)
+        self.keys = [
+            key for key in DOCUMENT_KEYS
+            if key == 'id' or key in self.fields
+        ]
+
+    def get_key(self, key):
+        if key in TEXT_KEYS:
+            return KeyTextTransform(
+                key, 'document__data', output_field=TextField())
+        return KeyTransform(key, 'document__data')
+
+    def values(self, queryset):
+        """
+        Превратить queryset рецептов в queryset словарей. Полный документ
+        читается одной колонкой: каждый ключ jsonb разбирал бы его заново.
+        """
+        if len(self.keys) == len(DOCUMENT_KEYS):
+            data = {'data': F('document__data')}
+        else:
+            data = {f'data_{key}': self.get_key(key) for key in self.keys}
+        return queryset.prefetch_related(None).values(
+            'id', 'updated_at', 'document__recipe_updated_at', **data)
+
+    def get_document(self, row):
+        if 'data' in row:
+            return row['data']
+        return {key: row[f'data_{key}'] for key in self.keys}
+
+    def get_documents(self, rows):
+        """Документы строк; недостающие и устаревшие пересобираются."""
+        documents = {}
+        missing, stale = [], []
+        for row in rows:
+            if row['document__recipe_updated_at'] is None:
+                missing.append(row['id'])
+            elif row['document__recipe_updated_at'] != row['updated_at']:
+                stale.append(row['id'])
+            else:
+                documents[row['id']] = self.get_document(row)
+        if missing or stale:
+            documents.update(
+                (recipe_id, document.data)
+                for recipe_id, document
+                in repair_documents(missing, stale).items()
+            )
+        return documents
+
+    def get_related_ids(self, model, column, ids):
+        """Какие из ids связаны с текущим юзером через model."""
+        if not self.user.is_authenticated or not ids:
+            return set()
+        shared = batch_related_ids(self.request, model, column, ids)
+        if shared is not None:
+            return shared
+        return set(
+            model.objects
+            .filter(user=self.user, **{f'{column}__in': ids})
+            .values_list(column, flat=True)
+        )
+
+    def get_flags(self, recipe_ids, author_ids):
+        """Множества подписок, избранного и покупок текущего юзера."""
+        return (
+            self.get_related_ids(Subscription, 'author_id', author_ids),
+            self.get_related_ids(Favorite, 'recipe_id', recipe_ids),
+            self.get_related_ids(ShoppingCart, 'recipe_id', recipe_ids),
+        )
+
+    def get_image(self, name):
+        if not name:
+            return None
+        return self.request.build_absolute_uri(self.storage.url(name))
+
+    def get_related(self, documents):
+        """Флаги текущего юзера — только для запрошенных полей."""
+        fields = self.fields
+        related = {}
+        if 'author' in fields:
+            related['subscribed'] = self.get_related_ids(
+                Subscription, 'author_id',
+                {document['author'][0] for document in documents})
+        recipe_ids = [document['id'] for document in documents]
+        if 'is_favorited' in fields:
+            related['favorited'] = self.get_related_ids(
+                Favorite, 'recipe_id', recipe_ids)
+        if 'is_in_shopping_cart' in fields:
+            related['in_cart'] = self.get_related_ids(
+                ShoppingCart, 'recipe_id', recipe_ids)
+        return related
+
+    def represent_document(self, document, related):
+        fields = self.fields
+        recipe = {
+            name: document[name]
+            for name in ('id', 'name', 'text', 'cooking_time')
+            if name in fields
+        }
+        if 'image' in fields:
+            recipe['image'] = self.get_image(document['image'])
+        if 'tags' in fields:
+            recipe['tags'] = [
+                dict(zip(TAG_FIELDS, tag)) for tag in document['tags']
+            ]
+        if 'author' in fields:
+            author = dict(zip(AUTHOR_FIELDS, document['author']))
+            author['is_subscribed'] = author['id'] in related['subscribed']
+            recipe['author'] = author
+        if 'ingredients' in fields:
+            recipe['ingredients'] = [
+                dict(zip(INGREDIENT_FIELDS, ingredient))
+                for ingredient in document['ingredients']
+            ]
+        if 'is_favorited' in fields:
+            recipe['is_favorited'] = document['id'] in related['favorited']
+        if 'is_in_shopping_cart' in fields:
+            recipe['is_in_shopping_cart'] = (
+                document['id'] in related['in_cart'])
+        return recipe
+
+    def represent(self, rows):
+        """Собрать список рецептов в формате RecipeReadSerializer."""
+        rows = list(rows)
+        by_id = self.get_documents(rows)
+        documents = [by_id[row['id']] for row in rows if row['id'] in by_id]
+        if not documents:
+            return []
+        related = self.get_related(documents)
+        return [
+            self.represent_document(document, related)
+            for document in documents
+        ]
@@ -1,8 +1,14 @@
+from urllib.parse import urlsplit
+
 from django.db import transaction
+from django.urls import reverse
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, status
 
-from recipes.constants import MAX_AMOUNT, MIN_AMOUNT
+from api.utils import batch_related_ids
+from jobs.queue import enqueue
+from recipes.constants import BATCH_MAX_REQUESTS, MAX_AMOUNT, MIN_AMOUNT
+from recipes.documents import refresh_documents
 from recipes.models import (AmountIngredient, Favorite, Ingredient,
                             Recipe, ShoppingCart, Tag)
 from users.models import Subscription, User
@@ -23,16 +29,23 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        return (
-            request.user.is_authenticated
-            and request.user.followed_users.filter(author=obj).exists()
-        )
+        if not request.user.is_authenticated:
+            return False
+        subscribed = batch_related_ids(
+            request, Subscription, 'author_id', [obj.pk])
+        if subscribed is not None:
+            return obj.pk in subscribed
+        return request.user.followed_users.filter(author=obj).exists()
 
 
 class SubscribeSerializer(UserSerializer):
-    """Serializer for subscriptions."""
+    """
+    Serializer for subscriptions.
+
+    With `fields` in the context only those fields are rendered.
+    """
 
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
@@ -42,6 +55,20 @@ class SubscribeSerializer(UserSerializer):
             'email', 'username', 'first_name', 'last_name'
         )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def get_recipes_count(self, obj):
+        """Число из аннотации queryset, если она есть."""
+        recipes_count = getattr(obj, 'recipes_count', None)
+        if recipes_count is None:
+            return obj.recipes.count()
+        return recipes_count
+
     def get_recipes(self, obj):
         queryset = obj.recipes.all()
         recipes_limit = self.context['request'].GET.get('recipes_limit')
@@ -178,6 +205,12 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return is_in_shopping_cart
 
 
+def enqueue_similar_update(recipe):
+    """Похожие рецепты пересчитает воркер, задача пишется в транзакции."""
+    enqueue('recipes.update_similar', {'recipe_id': recipe.pk},
+            dedup_key=f'similar:{recipe.pk}')
+
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Serializer for recipe creation."""
 
@@ -257,6 +290,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data, author=current_user)
         recipe.tags.set(tags)
         self.create_ingredients(recipe, ingredients)
+        enqueue_similar_update(recipe)
+        refresh_documents([recipe.pk])
         return recipe
 
     @transaction.atomic
@@ -266,7 +301,10 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         instance.ingredients.clear()
         ingredients = validated_data.pop('ingredients')
         self.create_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        enqueue_similar_update(instance)
+        recipe = super().update(instance, validated_data)
+        refresh_documents([recipe.pk])
+        return recipe
 
     def to_representation(self, recipe):
         return RecipeReadSerializer(recipe, context=self.context).data
@@ -289,6 +327,8 @@ class UserRecipeRelationSerializer(serializers.ModelSerializer):
         fields = ('user', 'recipe')
 
     def validate(self, data):
+        if self.instance is not None:
+            return data
         user_id = data.get('user').id
         recipe_id = data.get('recipe').id
         if self.Meta.model.objects.filter(user=user_id,
@@ -307,6 +347,12 @@ class ShoppingCartCreateDeleteSerializer(UserRecipeRelationSerializer):
 
     class Meta(UserRecipeRelationSerializer.Meta):
         model = ShoppingCart
+        fields = UserRecipeRelationSerializer.Meta.fields + ('servings',)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['servings'] = instance.servings
+        return data
 
 
 class FavoriteCreateDeleteSerializer(UserRecipeRelationSerializer):
@@ -314,3 +360,28 @@ class FavoriteCreateDeleteSerializer(UserRecipeRelationSerializer):
 
     class Meta(UserRecipeRelationSerializer.Meta):
         model = Favorite
+
+
+class BatchSubrequestSerializer(serializers.Serializer):
+    """Один запрос из batch: только GET к api."""
+
+    method = serializers.ChoiceField(choices=('GET',), default='GET')
+    url = serializers.CharField()
+
+    def validate_url(self, value):
+        path = urlsplit(value).path
+        if not path.startswith(reverse('api:api-root')):
+            raise serializers.ValidationError('Ожидается адрес api')
+        if path == reverse('api:batch-list'):
+            raise serializers.ValidationError('Вложенный batch запрещён')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    """Serializer for batch requests."""
+
+    requests = serializers.ListField(
+        child=BatchSubrequestSerializer(),
+        allow_empty=False,
+        max_length=BATCH_MAX_REQUESTS,
+    )
@@ -0,0 +1,119 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import user_cache
+from api.cache import (bump_version, mark_rankings_refreshed,
+                       mark_recipes_deleted)
+from recipes.deletion import recipes_hidden
+from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
+                            ShoppingCart, Tag)
+from recipes.rankings import rankings_refreshed
+from users.models import Subscription, User
+
+
+def bump_on_commit(*names):
+    """Счётчики увеличиваются после коммита, а не внутри транзакции."""
+    def bump():
+        for name in names:
+            bump_version(name)
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_on_commit('recipes', f'recipe:{instance.pk}')
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    bump_on_commit('recipes', f'recipe:{instance.pk}')
+    transaction.on_commit(mark_recipes_deleted)
+
+
+@receiver(recipes_hidden)
+def recipes_hidden_changed(sender, recipe_ids, **kwargs):
+    bump_on_commit(
+        'recipes', *(f'recipe:{recipe_id}' for recipe_id in recipe_ids))
+    transaction.on_commit(mark_recipes_deleted)
+
+
+@receiver(post_save, sender=AmountIngredient)
+@receiver(post_delete, sender=AmountIngredient)
+def amount_ingredient_changed(sender, instance, **kwargs):
+    bump_on_commit('recipes', f'recipe:{instance.recipe_id}')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_on_commit('recipes', f'recipe:{instance.pk}')
+    elif sender is Recipe.tags.through:
+        bump_on_commit('recipes', 'tag')
+    else:
+        bump_on_commit('recipes', 'ingredient')
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def favorite_changed(sender, instance, **kwargs):
+    bump_on_commit(f'favorite:{instance.user_id}')
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    bump_on_commit(f'shopping_cart:{instance.user_id}')
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    bump_on_commit(f'subscription:{instance.user_id}')
+
+
+@receiver(rankings_refreshed)
+def rankings_changed(sender, **kwargs):
+    bump_on_commit('recipes')
+    transaction.on_commit(mark_rankings_refreshed)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    bump_on_commit('tag')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    bump_on_commit('ingredient')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    forget_user(instance.pk)
+    bump_on_commit('user')
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Выход через djoser удаляет токен."""
+    user_cache.discard(f'token:{instance.key}')
+    forget_user(instance.user_id)
+
+
+def forget_user(user_id):
+    """
+    Drop cached authentication for the user in this process and, through
+    the shared version counter, in the other workers.
+    """
+    user_cache.discard_user(user_id)
+    bump_on_commit(f'auth:{user_id}')
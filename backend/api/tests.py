@@ -0,0 +1,769 @@
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from itertools import product
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.authentication import user_cache
+from api.cache import RANKINGS_REFRESHED_KEY, get_versions
+from api.checks import check_throttle_cache
+from api.changes import (change_listener, invalidate, latest_cursor,
+                         prune_changes, read_changes)
+from api.events import route
+from api.projections import RecipeProjection
+from api.serializers import RecipeReadSerializer
+from api.throttling import CostThrottle
+from api.transfer import IMPORT_STATE
+from api.utils import batch_related_ids
+from jobs.models import Job
+from jobs.queue import claim, execute
+from recipes.deletion import delete_recipe, dependents
+from recipes.documents import refresh_documents
+from recipes.models import (AmountIngredient, Change, Deletion, Favorite,
+                            Ingredient, Recipe, RecipeDocument, ShoppingCart,
+                            SimilarRecipe, Tag, UnitConversion)
+from recipes.rankings import refresh_rankings
+from recipes.similarity import (rebuild_similar_recipes,
+                                update_similar_recipes)
+from users.models import Subscription, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeProjectionTests(TestCase):
+    """RecipeProjection должна отдавать ровно то же, что сериализатор."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com', username=f'user{number}',
+                first_name='Имя', last_name='Фамилия', password='password')
+            for number in range(3)
+        ]
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'tag{number}',
+                color=f'#00000{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(4)
+        ]
+        for number in range(6):
+            recipe = Recipe(
+                name=f'Рецепт {number}', author=cls.users[number % 3],
+                text='Текст', cooking_time=number + 1)
+            recipe.image.save(
+                f'recipe{number}.png', ContentFile(b'image'), save=False)
+            recipe.save()
+            recipe.tags.set(tags[:number % 3 + 1])
+            for index in range(number % 4 + 1):
+                AmountIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredients[index],
+                    amount=index + 1)
+        cls.recipes = list(Recipe.objects.all())
+        Subscription.objects.create(user=cls.users[0], author=cls.users[1])
+        Favorite.objects.create(user=cls.users[0], recipe=cls.recipes[1])
+        ShoppingCart.objects.create(user=cls.users[0], recipe=cls.recipes[2])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, user, path):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def serialize(self, user, recipes, many):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user or AnonymousUser()
+        return RecipeReadSerializer(
+            recipes, many=many, context={'request': request}).data
+
+    def assertSameJSON(self, first, second):
+        """Сравнение отрендеренного JSON: учитывается и порядок ключей."""
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(first), renderer.render(second))
+
+    def test_list(self):
+        for user in (None, self.users[0]):
+            with self.subTest(user=user):
+                data = self.get(user, '/api/recipes/?limit=100')
+                self.assertSameJSON(
+                    data['results'], self.serialize(user, self.recipes, True))
+
+    def test_detail(self):
+        for user in (None, self.users[0]):
+            for recipe in self.recipes:
+                with self.subTest(user=user, recipe=recipe.pk):
+                    self.assertSameJSON(
+                        self.get(user, f'/api/recipes/{recipe.pk}/'),
+                        self.serialize(user, recipe, False))
+
+    def test_fields_and_omit(self):
+        user = self.users[0]
+        expected = self.serialize(user, self.recipes, True)
+        for query, keep in (
+            ('fields=id,name,is_favorited', {'id', 'name', 'is_favorited'}),
+            ('fields=author,tags', {'author', 'tags'}),
+            ('omit=text,ingredients,is_in_shopping_cart',
+             set(expected[0]) - {'text', 'ingredients',
+                                 'is_in_shopping_cart'}),
+        ):
+            with self.subTest(query=query):
+                data = self.get(user, f'/api/recipes/?limit=100&{query}')
+                self.assertSameJSON(data['results'], [
+                    {key: value for key, value in recipe.items()
+                     if key in keep}
+                    for recipe in expected
+                ])
+
+    def test_fields_select_only_their_document_keys(self):
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        recipe.name = '123'
+        recipe.save()
+        refresh_documents(recipe.pk for recipe in self.recipes)
+        self.assertDocumentFresh(recipe)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(None, '/api/recipes/?limit=100&fields=id,name')
+        self.assertEqual(data['results'][0], {
+            'id': self.recipes[0].pk, 'name': '123'})
+        document_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'recipes_recipedocument' in query['sql']
+        ]
+        self.assertTrue(document_queries)
+        request = Request(APIRequestFactory().get(
+            '/api/recipes/', {'fields': 'id,name'}))
+        request.user = AnonymousUser()
+        row = RecipeProjection(request).values(Recipe.objects.all()).first()
+        self.assertEqual(set(row), {
+            'id', 'updated_at', 'document__recipe_updated_at',
+            'data_id', 'data_name'})
+        for sql, key in product(
+                document_queries, ('ingredients', 'text', 'tags', 'author')):
+            self.assertNotIn(f'"{key}"', sql)
+            self.assertNotIn(f"'{key}'", sql)
+
+    def test_cached_anonymous_list_runs_no_queries(self):
+        """Тело и валидаторы берутся из кеша, ETag по-прежнему работает."""
+        client = APIClient()
+        paths = ('/api/recipes/?limit=3',
+                 f'/api/recipes/{self.recipes[0].pk}/')
+        for path in paths:
+            with self.subTest(path=path), mock.patch.object(
+                    change_listener, 'poll'):
+                response = client.get(path)
+                etag = response['ETag']
+                with self.assertNumQueries(0):
+                    response = client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['ETag'], etag)
+                with self.assertNumQueries(0):
+                    response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_similar_recipes_share_an_ingredient(self):
+        """
+        The rebuild scores only recipes sharing an ingredient, so the
+        incremental update of any recipe leaves its result as it is.
+        """
+        lonely = Recipe.objects.create(
+            name='Без общих ингредиентов', author=self.users[0],
+            text='Текст', cooking_time=1, image='recipes/lonely.png')
+        lonely.tags.set(Tag.objects.all())
+        AmountIngredient.objects.create(
+            recipe=lonely, amount=1, ingredient=Ingredient.objects.create(
+                name='Редкий', measurement_unit='г'))
+        rebuild_similar_recipes(processes=1, chunk_size=4)
+        rebuilt = set(SimilarRecipe.objects.values_list(
+            'recipe_id', 'similar_id', 'score'))
+        self.assertTrue(rebuilt)
+        self.assertFalse(SimilarRecipe.objects.filter(recipe=lonely).exists())
+        for recipe in Recipe.objects.all():
+            update_similar_recipes(recipe.pk)
+        self.assertEqual(set(SimilarRecipe.objects.values_list(
+            'recipe_id', 'similar_id', 'score')), rebuilt)
+
+    def test_batch_matches_direct_requests(self):
+        user = self.users[0]
+        recipe_ids = ','.join(str(recipe.pk) for recipe in self.recipes[:3])
+        urls = [
+            f'/api/recipes/?ids={recipe_ids}',
+            f'/api/recipes/{self.recipes[1].pk}/',
+            f'/api/users/{self.users[1].pk}/',
+        ]
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(
+            '/api/batch/', {'requests': [{'url': url} for url in urls]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        for url, result in zip(urls, response.data):
+            with self.subTest(url=url):
+                self.assertEqual(result['status'], 200)
+                self.assertSameJSON(result['body'], self.get(user, url))
+
+    def test_batch_related_ids_reads_only_new_ids(self):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = self.users[0]
+        request.shared_cache = {}
+        favorited = self.recipes[1].pk
+        with self.assertNumQueries(1):
+            self.assertEqual(batch_related_ids(
+                request, Favorite, 'recipe_id',
+                [self.recipes[0].pk, favorited]), {favorited})
+        with self.assertNumQueries(0):
+            self.assertEqual(batch_related_ids(
+                request, Favorite, 'recipe_id', [favorited]), {favorited})
+        with self.assertNumQueries(1):
+            batch_related_ids(
+                request, Favorite, 'recipe_id',
+                [favorited, self.recipes[2].pk])
+        self.assertEqual(
+            set(request.shared_cache['recipes.Favorite', 'recipe_id']),
+            {recipe.pk for recipe in self.recipes[:3]})
+
+    def assertMatchesSerializer(self, user, recipe):
+        data = self.get(user, '/api/recipes/?limit=100')
+        self.assertSameJSON(
+            data['results'],
+            self.serialize(user, Recipe.objects.all(), True))
+        self.assertSameJSON(
+            self.get(user, f'/api/recipes/{recipe.pk}/'),
+            self.serialize(user, Recipe.objects.get(pk=recipe.pk), False))
+
+    def assertDocumentFresh(self, recipe):
+        document = RecipeDocument.objects.get(recipe=recipe)
+        self.assertEqual(
+            document.recipe_updated_at,
+            Recipe.objects.get(pk=recipe.pk).updated_at)
+
+    def test_documents_follow_writes(self):
+        """
+        Renames rebuild documents in their transaction; a direct save or
+        a deleted tag leaves them stale and a missing one is rebuilt on
+        read. The output stays equal to the serializer either way.
+        """
+        user = self.users[0]
+        author = self.users[1]
+        recipe = Recipe.objects.filter(author=author).first()
+
+        tag = Tag.objects.get(slug='tag0')
+        tag.name = 'Новое имя'
+        tag.save()
+        self.assertDocumentFresh(recipe)
+        self.assertMatchesSerializer(user, recipe)
+
+        author.first_name = 'Другое'
+        author.save()
+        self.assertDocumentFresh(recipe)
+        self.assertMatchesSerializer(user, recipe)
+
+        recipe.name = 'Изменён'
+        recipe.save()
+        self.assertMatchesSerializer(user, recipe)
+
+        Tag.objects.get(slug='tag2').delete()
+        self.assertMatchesSerializer(user, recipe)
+
+        RecipeDocument.objects.filter(recipe=recipe).delete()
+        self.assertMatchesSerializer(user, recipe)
+
+    def test_create_and_update_refresh_document(self):
+        user = self.users[0]
+        client = APIClient()
+        client.force_authenticate(user)
+        stream = io.BytesIO()
+        Image.new('RGB', (1, 1)).save(stream, 'PNG')
+        data = {
+            'name': 'Новый', 'text': 'Текст', 'cooking_time': 5,
+            'image': 'data:image/png;base64,'
+                     + base64.b64encode(stream.getvalue()).decode(),
+            'tags': [Tag.objects.first().pk],
+            'ingredients': [
+                {'id': Ingredient.objects.first().pk, 'amount': 3}],
+        }
+        response = client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertDocumentFresh(recipe)
+        data.update(name='Изменённый', tags=[Tag.objects.last().pk])
+        response = client.patch(
+            f'/api/recipes/{recipe.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertDocumentFresh(recipe)
+        self.assertMatchesSerializer(user, recipe)
+
+
+class ChangeLogTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rankings_refresh_reaches_other_processes(self):
+        """
+        The refresh is written to the log: a process replaying it drops
+        its recipe responses, clients of /api/changes/ do not see it.
+        """
+        since = latest_cursor()
+        refresh_rankings()
+        changes, cursor, has_more = read_changes(since)
+        self.assertEqual(
+            changes, [(cursor, Change.RANKING, 0, False, None, False)])
+        cache.clear()
+        version = get_versions('recipes')
+        invalidate(changes)
+        self.assertNotEqual(get_versions('recipes'), version)
+        self.assertIsNotNone(cache.get(RANKINGS_REFRESHED_KEY))
+        response = APIClient().get(f'/api/changes/?since={since}')
+        self.assertEqual(response.data['changes'], [])
+
+    def test_events_carry_their_own_cursor(self):
+        """Каждое событие пачки получает id своей строки журнала."""
+        user = User.objects.create_user(
+            email='user@example.com', username='user', password='password')
+        authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}', password='password')
+            for number in range(2)
+        ]
+        since = latest_cursor()
+        for author in authors:
+            Subscription.objects.create(user=user, author=author)
+        changes, cursor, has_more = read_changes(since)
+        events = [event for channel, event in route(changes)]
+        self.assertEqual(
+            [(event['cursor'], event['id']) for event in events],
+            [(pk, author.pk) for pk, author in zip(
+                Change.objects.filter(pk__gt=since).values_list(
+                    'pk', flat=True), authors)])
+        self.assertEqual(events[-1]['cursor'], cursor)
+
+    def test_pruned_cursor_asks_for_resync(self):
+        """Старые события удаляются, кроме последнего; курсор до них - 410."""
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'tag{number}',
+                color=f'#00000{number}')
+            for number in range(3)
+        ]
+        Change.objects.update(created_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(prune_changes(), 2)
+        change = Change.objects.get()
+        self.assertEqual(change.object_id, tags[2].pk)
+        client = APIClient()
+        response = client.get(f'/api/changes/?since={change.pk - 2}')
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.data['cursor'], change.pk)
+        response = client.get(f'/api/changes/?since={change.pk - 1}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_reaches_other_workers(self):
+        """
+        Another worker still holds the token in its user cache and its
+        own cache never saw the version bump: the change log drops it.
+        """
+        user = User.objects.create_user(
+            email='user@example.com', username='user', password='password')
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with mock.patch.object(change_listener, 'poll'):
+            self.assertEqual(client.get('/api/users/me/').status_code, 200)
+            entry = user_cache.entries[f'token:{token.key}']
+            since = latest_cursor()
+            response = client.post('/api/auth/token/logout/')
+            self.assertEqual(response.status_code, 204)
+        user_cache.entries[f'token:{token.key}'] = entry
+        cache.clear()
+        with mock.patch.object(change_listener, 'cursor', since), \
+                mock.patch.object(change_listener, 'next_poll', 0):
+            self.assertEqual(client.get('/api/users/me/').status_code, 401)
+
+
+class TransferTests(TestCase):
+    """Выгрузка и загрузка через export_data / import_data."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com', username=f'user{number}',
+                password='password')
+            for number in range(2)
+        ]
+        self.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'tag{number}',
+                color=f'#00000{number}')
+            for number in range(2)
+        ]
+        ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+        self.recipes = []
+        for number in range(5):
+            recipe = Recipe(
+                name=f'Рецепт {number}', author=self.users[number % 2],
+                text='Текст', cooking_time=number + 1)
+            recipe.image.save(
+                f'recipe{number}.png', ContentFile(b'image'), save=False)
+            recipe.save()
+            recipe.tags.set(self.tags[:number % 2 + 1])
+            AmountIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=number + 1)
+            Favorite.objects.create(user=self.users[0], recipe=recipe)
+            self.recipes.append(recipe)
+        delete_recipe(self.recipes[-1])
+
+    def run_command(self, name):
+        call_command(name, self.directory, '--chunk-size', '2',
+                     stdout=io.StringIO())
+
+    def read_ids(self, table):
+        path = os.path.join(self.directory, f'{table}.ndjson')
+        with open(path, encoding='utf-8') as stream:
+            return [json.loads(line)['id'] for line in stream]
+
+    def snapshot(self, recipes):
+        return sorted(
+            (recipe.name, recipe.author.email, recipe.cooking_time,
+             tuple(recipe.tags.order_by('slug').values_list(
+                 'slug', flat=True)),
+             tuple(AmountIngredient.objects.filter(recipe=recipe)
+                   .values_list('ingredient__name', 'amount')),
+             Favorite.objects.filter(recipe=recipe).count())
+            for recipe in recipes
+        )
+
+    def test_round_trip_with_resume(self):
+        self.run_command('export_data')
+        visible = [recipe.pk for recipe in self.recipes[:-1]]
+        self.assertEqual(self.read_ids('recipes'), visible)
+        self.assertEqual(len(self.read_ids('favorites')), len(visible))
+        # Выгрузка с checkpoint посередине дописывает остаток заново.
+        path = os.path.join(self.directory, 'recipes.ndjson')
+        with open(path, 'rb') as stream:
+            exported = stream.read()
+        first_line = exported.split(b'\n')[0] + b'\n'
+        with open(f'{path}.checkpoint', 'w') as stream:
+            json.dump({'last_pk': visible[0], 'offset': len(first_line),
+                       'rows': 1, 'done': False}, stream)
+        self.run_command('export_data')
+        with open(path, 'rb') as stream:
+            self.assertEqual(stream.read(), exported)
+
+        before = set(Recipe.all_objects.values_list('pk', flat=True))
+        self.run_command('import_data')
+        # Повтор прерванного импорта с начала таблиц ничего не дублирует.
+        state_path = os.path.join(self.directory, IMPORT_STATE)
+        with open(state_path) as stream:
+            state = json.load(stream)
+        for table in ('recipes', 'amount_ingredients', 'favorites'):
+            state['positions'][table] = 0
+        with open(state_path, 'w') as stream:
+            json.dump(state, stream)
+        self.run_command('import_data')
+
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Tag.objects.count(), 2)
+        imported = Recipe.all_objects.exclude(pk__in=before)
+        self.assertFalse(imported.filter(deleted_at__isnull=False).exists())
+        self.assertEqual(
+            self.snapshot(imported),
+            self.snapshot(Recipe.objects.filter(pk__in=visible)))
+
+    def test_tag_color_taken_by_another_tag(self):
+        """A tag is matched by slug or name, never by color alone."""
+        self.run_command('export_data')
+        Tag.objects.filter(pk=self.tags[0].pk).update(
+            name='Другой', slug='other')
+        with self.assertRaisesMessage(CommandError, '#000000'):
+            self.run_command('import_data')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+@mock.patch('recipes.deletion.DELETION_BATCHES_PER_JOB', 2)
+@mock.patch('recipes.deletion.DELETION_BATCH_SIZE', 2)
+class DeletionTests(TestCase):
+    """Фоновое удаление: пачки, продолжение через очередь, прогресс."""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com', username=f'user{number}',
+                password='password')
+            for number in range(3)
+        ]
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'tag{number}',
+                color=f'#00000{number}')
+            for number in range(2)
+        ]
+        self.recipe = Recipe(
+            name='Рецепт', author=self.users[0], text='Текст',
+            cooking_time=1)
+        self.recipe.image.save(
+            'recipe.png', ContentFile(b'image'), save=False)
+        self.recipe.save()
+        self.recipe.tags.set(tags)
+        for number in range(3):
+            AmountIngredient.objects.create(
+                recipe=self.recipe,
+                ingredient=Ingredient.objects.create(
+                    name=f'Ингредиент {number}', measurement_unit='г'),
+                amount=number + 1)
+        for user in self.users[1:]:
+            Favorite.objects.create(user=user, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.users[1], recipe=self.recipe)
+
+    def run_jobs(self, limit=None):
+        for _ in range(limit or 100):
+            queued = claim()
+            if queued is None:
+                return
+            execute(queued)
+
+    def test_purge_in_batches_and_resume(self):
+        total = sum(
+            queryset.count()
+            for queryset in dependents(Deletion.RECIPE, self.recipe.pk))
+        self.assertGreater(total, 4)
+        deletion = delete_recipe(self.recipe)
+        self.assertFalse(Recipe.objects.filter(pk=self.recipe.pk).exists())
+        self.run_jobs(limit=1)
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.total, total)
+        # Пачка не переходит на следующую таблицу: два избранных, корзина.
+        self.assertEqual(deletion.deleted, 3)
+        self.assertIsNone(deletion.finished_at)
+        # Сам рецепт удаляется последним, после зависимых строк.
+        self.assertTrue(
+            Recipe.all_objects.filter(pk=self.recipe.pk).exists())
+        self.assertTrue(Job.objects.filter(
+            name='recipes.purge', status=Job.QUEUED,
+            payload={'deletion_id': deletion.pk}).exists())
+        self.run_jobs()
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.total, total)
+        self.assertEqual(deletion.deleted, total)
+        self.assertIsNotNone(deletion.finished_at)
+        self.assertFalse(any(
+            queryset.exists()
+            for queryset in dependents(Deletion.RECIPE, self.recipe.pk)))
+        self.assertGreater(
+            Job.objects.filter(name='recipes.purge', status=Job.DONE)
+            .count(), 2)
+
+    def test_admin_asks_for_dependent_delete_permissions(self):
+        model_admin = admin.site._registry[Recipe]
+        staff = self.users[2]
+        staff.is_staff = True
+        staff.save()
+        staff.user_permissions.add(
+            Permission.objects.get(codename='delete_recipe'))
+        request = RequestFactory().post('/')
+        request.user = User.objects.get(pk=staff.pk)
+        _, _, perms_needed, _ = model_admin.get_deleted_objects(
+            [self.recipe], request)
+        self.assertEqual(perms_needed, {
+            Favorite._meta.verbose_name,
+            ShoppingCart._meta.verbose_name,
+            AmountIngredient._meta.verbose_name,
+        })
+        staff.user_permissions.add(*Permission.objects.filter(codename__in=[
+            'delete_favorite', 'delete_shoppingcart',
+            'delete_amountingredient']))
+        request.user = User.objects.get(pk=staff.pk)
+        _, _, perms_needed, _ = model_admin.get_deleted_objects(
+            [self.recipe], request)
+        self.assertEqual(perms_needed, set())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ShoppingCartTests(TestCase):
+    """Список покупок с множителем порций и переводом единиц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com', username=f'user{number}',
+                password='password')
+            for number in range(2)
+        ]
+        UnitConversion.objects.create(
+            unit='кг', canonical_unit='г', factor=1000)
+        cls.recipes = []
+        for number, ingredients in enumerate((
+            (('мука', 'г', 200), ('соль', 'г', 5)),
+            (('мука', 'кг', 1),),
+        )):
+            recipe = Recipe(
+                name=f'Рецепт {number}', author=cls.users[0],
+                text='Текст', cooking_time=1)
+            recipe.image.save(
+                f'recipe{number}.png', ContentFile(b'image'), save=False)
+            recipe.save()
+            for name, unit, amount in ingredients:
+                ingredient, _ = Ingredient.objects.get_or_create(
+                    name=name, measurement_unit=unit)
+                AmountIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=amount)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def download(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()[2:]
+
+    def test_download_scales_and_converts_units(self):
+        for recipe in self.recipes:
+            ShoppingCart.objects.create(
+                user=self.users[0], recipe=recipe, servings=2)
+        # Чужая строка корзины с другим множителем не должна попасть
+        # ни в выборку, ни в множитель порций.
+        ShoppingCart.objects.create(
+            user=self.users[1], recipe=self.recipes[0], servings=3)
+        self.assertEqual(
+            self.download(), ['мука - г - 2400', 'соль - г - 10'])
+
+    def test_servings_from_post_and_patch(self):
+        path = f'/api/recipes/{self.recipes[0].pk}/shopping_cart/'
+        response = self.client.post(path, {'servings': 3}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['servings'], 3)
+        self.assertEqual(
+            self.download(), ['мука - г - 600', 'соль - г - 15'])
+        response = self.client.patch(path, {'servings': 4}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['servings'], 4)
+        self.assertEqual(
+            self.download(), ['мука - г - 800', 'соль - г - 20'])
+
+    def test_post_without_servings_adds_one(self):
+        path = f'/api/recipes/{self.recipes[1].pk}/shopping_cart/'
+        self.assertEqual(self.client.post(path).status_code, 201)
+        self.assertEqual(self.download(), ['мука - г - 1000'])
+
+    def test_patch_rejects_invalid_servings(self):
+        ShoppingCart.objects.create(
+            user=self.users[0], recipe=self.recipes[0], servings=2)
+        path = f'/api/recipes/{self.recipes[0].pk}/shopping_cart/'
+        for data in ({'servings': 0}, {}, {'servings': 101}):
+            with self.subTest(data=data):
+                response = self.client.patch(path, data, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('servings', response.data)
+        self.assertEqual(ShoppingCart.objects.get(
+            user=self.users[0], recipe=self.recipes[0]).servings, 2)
+        other = f'/api/recipes/{self.recipes[1].pk}/shopping_cart/'
+        self.assertEqual(
+            self.client.patch(other, {'servings': 2}, format='json')
+            .status_code, 404)
+
+
+class CostThrottleTests(TestCase):
+    """Ведро на 4 токена, пополняется по одному за 15 секунд."""
+
+    class Throttle(CostThrottle):
+        rate = '4/min'
+
+    class View:
+        throttle_costs = {'list': 1, 'download': 10}
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+        self.user = User.objects.create_user(
+            email='user@example.com', username='user', password='password')
+
+    def spend(self, action='list'):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = self.user
+        view = self.View()
+        view.action = action
+        throttle = self.Throttle()
+        throttle.timer = lambda: self.now
+        allowed = throttle.allow_request(request, view)
+        return allowed, throttle.wait(), request.rate_limit_headers
+
+    def test_bucket_refills_evenly(self):
+        for remaining in (3, 2, 1, 0):
+            allowed, _, headers = self.spend()
+            self.assertTrue(allowed)
+            self.assertEqual(headers['RateLimit-Remaining'], str(remaining))
+        allowed, wait, headers = self.spend()
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 15)
+        self.assertEqual(headers['RateLimit-Reset'], '60')
+        # Через 15 секунд в ведре один токен, а не целое окно.
+        self.now += 15
+        self.assertTrue(self.spend()[0])
+        self.assertFalse(self.spend()[0])
+        self.now += 45
+        self.assertEqual(
+            [self.spend()[0] for _ in range(4)], [True, True, True, False])
+
+    def test_cost_is_capped_by_the_bucket(self):
+        self.assertTrue(self.spend()[0])
+        allowed, wait, _ = self.spend('download')
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 15)
+        self.now += 15
+        allowed, _, headers = self.spend('download')
+        self.assertTrue(allowed)
+        self.assertEqual(headers['RateLimit-Remaining'], '0')
+
+    def test_throttle_needs_redis(self):
+        with mock.patch.dict(
+                api_settings.DEFAULT_THROTTLE_RATES, {'cost': '60/min'}):
+            self.assertEqual(
+                [error.id for error in check_throttle_cache(None)],
+                ['api.E001'])
+            with self.settings(REDIS_CACHE=True):
+                self.assertEqual(check_throttle_cache(None), [])
@@ -0,0 +1,110 @@
+import math
+import threading
+
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+# Ведро хранится как момент, когда оно снова наполнится (GCRA).
+# Ответ: разрешён ли запрос и на сколько секунд ведро занято после него.
+SPEND_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local full_at = math.max(tonumber(redis.call('GET', KEYS[1]) or 0), now)
+local busy = full_at - now + tonumber(ARGV[2]) * interval
+if busy > tonumber(ARGV[3]) * interval then
+    return {0, tostring(full_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(now + busy),
+           'PX', math.ceil(busy * 1000))
+return {1, tostring(busy)}
+"""
+
+
+class CostThrottle(SimpleRateThrottle):
+    """
+    Token bucket throttle that charges every action its own cost.
+
+    A view lists costs by action name in `throttle_costs` (other actions
+    are free) or computes them in `get_throttle_cost(request)`. A user (or
+    an address for anonymous clients) has a bucket of `cost` rate tokens
+    that refills evenly over the rate's duration, so there is no burst at
+    a window boundary. The bucket is kept as the time it is full again
+    (GCRA) and updated by a Lua script in Redis, shared by all workers;
+    with a process-local cache it is updated under a lock, for tests and
+    a single process. See api.checks.
+    """
+
+    scope = 'cost'
+    lock = threading.Lock()
+    spend_script = None
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def get_cost(self, request, view):
+        get_throttle_cost = getattr(view, 'get_throttle_cost', None)
+        if get_throttle_cost is not None:
+            return get_throttle_cost(request)
+        costs = getattr(view, 'throttle_costs', {})
+        return costs.get(getattr(view, 'action', None), 0)
+
+    def spend_shared(self, key, cost, interval):
+        if CostThrottle.spend_script is None:
+            client = self.cache.client.get_client(write=True)
+            CostThrottle.spend_script = client.register_script(SPEND_SCRIPT)
+        allowed, busy = self.spend_script(
+            keys=[self.cache.make_key(key)],
+            args=[interval, cost, self.num_requests])
+        return bool(allowed), float(busy)
+
+    def spend_local(self, key, cost, interval):
+        with self.lock:
+            now = self.timer()
+            full_at = max(self.cache.get(key, 0), now)
+            busy = full_at - now + cost * interval
+            if busy > self.num_requests * interval:
+                return False, full_at - now
+            self.cache.set(key, now + busy, math.ceil(busy))
+            return True, busy
+
+    def allow_request(self, request, view):
+        cost = self.get_cost(request, view)
+        if not cost or self.rate is None:
+            return True
+        # Дороже полного ведра действие не выполнилось бы никогда.
+        cost = min(cost, self.num_requests)
+        interval = self.duration / self.num_requests
+        key = self.get_cache_key(request, view)
+        if settings.REDIS_CACHE:
+            allowed, busy = self.spend_shared(key, cost, interval)
+        else:
+            allowed, busy = self.spend_local(key, cost, interval)
+        self.wait_time = 0 if allowed else (
+            busy + cost * interval - self.duration)
+        request.rate_limit_headers = {
+            'RateLimit-Limit': str(self.num_requests),
+            'RateLimit-Remaining': str(max(
+                0, math.floor(self.num_requests - busy / interval))),
+            'RateLimit-Reset': str(math.ceil(busy)),
+        }
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+class RateLimitHeadersMixin:
+    """Заголовки RateLimit-* для действий, проверенных CostThrottle."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        for name, value in getattr(
+                request, 'rate_limit_headers', {}).items():
+            response[name] = value
+        return response
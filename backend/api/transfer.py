@@ -0,0 +1,369 @@
+"""
+Portable NDJSON export and import of the whole dataset.
+
+Every table goes to its own `<name>.ndjson`, one object per line, read
+by keyset pagination in primary key order, so memory does not grow with
+the table. Recipe images are copied to `media/` next to the files.
+
+Import keeps the original ids shifted by the current maximum id of the
+table, which makes a repeated chunk an ignored conflict instead of a
+duplicate. Users, tags and ingredients already present (same email,
+slug, name...) are reused; those remappings are kept in a SQLite file
+next to the dump. A new row whose other unique value (a tag color) is
+taken stops the import with ImportConflict. Both directions write a
+checkpoint after every chunk and continue from it when run again.
+Recipes hidden for deletion are not exported.
+"""
+import json
+import os
+import shutil
+import sqlite3
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.files import File
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from recipes.models import (AmountIngredient, Change, Favorite, Ingredient,
+                            Recipe, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+TRANSFER_CHUNK_SIZE = 1000
+IMPORT_STATE = 'import_state.json'
+IMPORT_IDS = 'import_ids.sqlite3'
+MEDIA_DIR = 'media'
+
+
+class ImportConflict(Exception):
+    """Новая строка заняла бы уникальное значение другой записи."""
+
+
+class Table:
+    """
+    How one model is exported and imported.
+
+    `foreign_keys` maps a column to the table it points to, `natural_keys`
+    are the unique field sets an existing row is matched by, `change` is
+    (kind, object column, owner column) for the change log and `lookup`
+    filters the exported rows.
+    """
+
+    def __init__(self, name, model, foreign_keys=None, natural_keys=(),
+                 files=(), change=None, lookup=None):
+        self.name = name
+        self.model = model
+        self.foreign_keys = foreign_keys or {}
+        self.natural_keys = natural_keys
+        self.files = files
+        self.change = change
+        self.lookup = lookup or {}
+
+    @property
+    def fields(self):
+        return [field.attname for field in self.model._meta.concrete_fields]
+
+
+TABLES = (
+    Table('users', User,
+          natural_keys=(('email',), ('username',)),
+          change=(Change.USER, 'id', None)),
+    Table('tags', Tag,
+          natural_keys=(('slug',), ('name',)),
+          change=(Change.TAG, 'id', None)),
+    Table('ingredients', Ingredient,
+          natural_keys=(('name', 'measurement_unit'),),
+          change=(Change.INGREDIENT, 'id', None)),
+    Table('recipes', Recipe,
+          foreign_keys={'author_id': 'users'},
+          files=('image',),
+          change=(Change.RECIPE, 'id', None),
+          lookup={'deleted_at__isnull': True}),
+    Table('recipe_tags', Recipe.tags.through,
+          foreign_keys={'recipe_id': 'recipes', 'tag_id': 'tags'},
+          lookup={'recipe__deleted_at__isnull': True}),
+    Table('amount_ingredients', AmountIngredient,
+          foreign_keys={'recipe_id': 'recipes',
+                        'ingredient_id': 'ingredients'},
+          lookup={'recipe__deleted_at__isnull': True}),
+    Table('subscriptions', Subscription,
+          foreign_keys={'user_id': 'users', 'author_id': 'users'},
+          change=(Change.SUBSCRIPTION, 'author_id', 'user_id')),
+    Table('favorites', Favorite,
+          foreign_keys={'user_id': 'users', 'recipe_id': 'recipes'},
+          change=(Change.FAVORITE, 'recipe_id', 'user_id'),
+          lookup={'recipe__deleted_at__isnull': True}),
+    Table('shopping_carts', ShoppingCart,
+          foreign_keys={'user_id': 'users', 'recipe_id': 'recipes'},
+          change=(Change.SHOPPING_CART, 'recipe_id', 'user_id'),
+          lookup={'recipe__deleted_at__isnull': True}),
+)
+
+TABLES_BY_NAME = {table.name: table for table in TABLES}
+
+
+def read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+
+def write_json(path, data):
+    """Записать через временный файл, чтобы checkpoint не побился."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as stream:
+        json.dump(data, stream)
+        stream.flush()
+        os.fsync(stream.fileno())
+    os.replace(temporary, path)
+
+
+def export_table(name, directory, chunk_size=TRANSFER_CHUNK_SIZE):
+    """
+    Дописать таблицу в NDJSON с места последнего checkpoint.
+
+    Таблица передаётся по имени: так её можно отдать в процесс пула.
+    """
+    table = TABLES_BY_NAME[name]
+    path = os.path.join(directory, f'{table.name}.ndjson')
+    checkpoint_path = f'{path}.checkpoint'
+    state = read_json(
+        checkpoint_path, {'last_pk': 0, 'offset': 0, 'rows': 0, 'done': False})
+    if state['done']:
+        return state['rows']
+    storage = None
+    if table.files:
+        storage = table.model._meta.get_field(table.files[0]).storage
+    with open(path, 'ab') as stream:
+        stream.truncate(state['offset'])
+        while True:
+            rows = list(
+                table.model._base_manager
+                .filter(pk__gt=state['last_pk'], **table.lookup)
+                .order_by('pk').values(*table.fields)[:chunk_size]
+            )
+            if not rows:
+                break
+            for row in rows:
+                for field in table.files:
+                    if row[field]:
+                        export_file(storage, row[field], directory)
+                stream.write(json.dumps(
+                    row, cls=DjangoJSONEncoder, ensure_ascii=False
+                ).encode('utf-8') + b'\n')
+            stream.flush()
+            os.fsync(stream.fileno())
+            state.update(last_pk=rows[-1]['id'], offset=stream.tell(),
+                         rows=state['rows'] + len(rows))
+            write_json(checkpoint_path, state)
+    state['done'] = True
+    write_json(checkpoint_path, state)
+    return state['rows']
+
+
+def export_file(storage, name, directory):
+    target = os.path.join(directory, MEDIA_DIR, name)
+    if os.path.exists(target) or not storage.exists(name):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with storage.open(name) as source, open(f'{target}.tmp', 'wb') as copy:
+        shutil.copyfileobj(source, copy)
+    os.replace(f'{target}.tmp', target)
+
+
+def import_file(storage, name, directory):
+    """Файл с тем же именем и размером считается уже загруженным."""
+    source = os.path.join(directory, MEDIA_DIR, name)
+    if not os.path.exists(source):
+        return name
+    if (storage.exists(name)
+            and storage.size(name) == os.path.getsize(source)):
+        return name
+    with open(source, 'rb') as stream:
+        return storage.save(name, File(stream))
+
+
+@contextmanager
+def original_timestamps(models):
+    """
+    Не давать auto_now_add затирать импортированные даты создания.
+
+    Поля auto_now (updated_at) получают время импорта: по ним читатели
+    вроде PantryIndex подтягивают изменения, и рецепт со старой датой
+    они бы не заметили.
+    """
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class IdMap:
+    """Old id -> new id, backed by SQLite so memory stays flat."""
+
+    def __init__(self, path, offsets):
+        self.offsets = offsets
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS ids (table_name TEXT, old_id INTEGER,'
+            ' new_id INTEGER, PRIMARY KEY (table_name, old_id))')
+
+    def get(self, table_name, old_id):
+        row = self.db.execute(
+            'SELECT new_id FROM ids WHERE table_name = ? AND old_id = ?',
+            (table_name, old_id)).fetchone()
+        if row is not None:
+            return row[0]
+        return old_id + self.offsets[table_name]
+
+    def set_many(self, table_name, pairs):
+        self.db.executemany(
+            'INSERT OR REPLACE INTO ids VALUES (?, ?, ?)',
+            ((table_name, old_id, new_id) for old_id, new_id in pairs))
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+def match_existing(table, rows):
+    """Найти уже существующие строки по уникальным полям: old id -> id."""
+    matched = {}
+    for key in table.natural_keys:
+        values = {row[key[0]] for row in rows if row['id'] not in matched}
+        if not values:
+            break
+        existing = {
+            item[1:]: item[0]
+            for item in table.model.objects.filter(
+                **{f'{key[0]}__in': values}).values_list('pk', *key)
+        }
+        for row in rows:
+            found = existing.get(tuple(row[name] for name in key))
+            if row['id'] not in matched and found is not None:
+                matched[row['id']] = found
+    return matched
+
+
+def check_conflicts(table, rows):
+    """
+    Unique values of the new rows must be free: bulk_create would drop a
+    conflicting row silently and its references would point nowhere.
+    Rows of an interrupted chunk already have their new ids and are
+    skipped.
+    """
+    matched = {field for key in table.natural_keys for field in key}
+    for field in table.model._meta.concrete_fields:
+        if (not field.unique or field.primary_key
+                or field.attname in matched):
+            continue
+        taken = list(
+            table.model._base_manager
+            .filter(**{f'{field.attname}__in': [
+                row[field.attname] for row in rows]})
+            .exclude(pk__in=[row['id'] for row in rows])
+            .values_list(field.attname, flat=True)
+        )
+        if taken:
+            raise ImportConflict(
+                f'{table.name}: {field.attname} '
+                f'{", ".join(map(str, taken))} уже занято другими записями')
+
+
+def import_chunk(table, rows, idmap, directory):
+    matched = match_existing(table, rows)
+    idmap.set_many(table.name, matched.items())
+    storage = None
+    if table.files:
+        storage = table.model._meta.get_field(table.files[0]).storage
+    rows = [row for row in rows if row['id'] not in matched]
+    for row in rows:
+        row['id'] = idmap.get(table.name, row['id'])
+        for column, target in table.foreign_keys.items():
+            row[column] = idmap.get(target, row[column])
+    check_conflicts(table, rows)
+    objects = []
+    for row in rows:
+        for field in table.files:
+            if row[field]:
+                row[field] = import_file(storage, row[field], directory)
+        objects.append(table.model(**row))
+    with transaction.atomic():
+        table.model.objects.bulk_create(objects, ignore_conflicts=True)
+        if table.change:
+            kind, object_column, owner_column = table.change
+            Change.objects.bulk_create(
+                Change(kind=kind, object_id=getattr(obj, object_column),
+                       owner_id=owner_column and getattr(obj, owner_column))
+                for obj in objects
+            )
+    idmap.commit()
+    return len(objects)
+
+
+def import_table(table, directory, state, idmap,
+                 chunk_size=TRANSFER_CHUNK_SIZE):
+    """Загрузить NDJSON таблицы пачками, отмечая позицию в файле."""
+    path = os.path.join(directory, f'{table.name}.ndjson')
+    state_path = os.path.join(directory, IMPORT_STATE)
+    if not os.path.exists(path):
+        return 0
+    imported = 0
+    with open(path, 'rb') as stream:
+        stream.seek(state['positions'].get(table.name, 0))
+        while True:
+            lines = list(islice(stream, chunk_size))
+            if not lines:
+                break
+            imported += import_chunk(
+                table, [json.loads(line) for line in lines], idmap, directory)
+            state['positions'][table.name] = stream.tell()
+            write_json(state_path, state)
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+                no_style(), [table.model]):
+            cursor.execute(sql)
+    return imported
+
+
+def import_dataset(directory, chunk_size=TRANSFER_CHUNK_SIZE, log=print):
+    """
+    Import every table in foreign key order.
+
+    Id offsets are fixed on the first run and stored with the positions,
+    so a resumed import maps ids exactly as the interrupted one did.
+    """
+    state_path = os.path.join(directory, IMPORT_STATE)
+    state = read_json(state_path, None)
+    if state is None:
+        state = {
+            'offsets': {
+                table.name: table.model._base_manager.order_by('-pk')
+                .values_list('pk', flat=True).first() or 0
+                for table in TABLES
+            },
+            'positions': {},
+        }
+        write_json(state_path, state)
+    idmap = IdMap(os.path.join(directory, IMPORT_IDS), state['offsets'])
+    try:
+        with original_timestamps(table.model for table in TABLES):
+            for table in TABLES:
+                count = import_table(table, directory, state, idmap,
+                                     chunk_size)
+                log(f'{table.name}: {count}')
+    finally:
+        idmap.close()
@@ -1,8 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from api.views import (
-    IngredientViewSet, RecipeViewSet,
+    BatchViewSet, ChangeViewSet, IngredientViewSet, RecipeViewSet,
     TagViewSet, UserViewSet
 )
 
@@ -11,6 +12,8 @@ app_name = 'api'
 
 v1_router = DefaultRouter()
 
+v1_router.register('batch', BatchViewSet, basename='batch')
+v1_router.register('changes', ChangeViewSet, basename='changes')
 v1_router.register('ingredients', IngredientViewSet, basename='ingredients')
 v1_router.register('recipes', RecipeViewSet, basename='recipes')
 v1_router.register('tags', TagViewSet, basename='tags')
@@ -21,3 +24,6 @@ urlpatterns = [
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.JWT_AUTH:
+    urlpatterns.append(path('auth/', include('djoser.urls.jwt')))
@@ -1,10 +1,13 @@
 from io import StringIO
 
+from django.db import transaction
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.response import Response
 
+from recipes.constants import MAX_FLAGS_IDS
+
 
 def generate_shopping_cart(shopping_cart):
     text_stream = StringIO()
@@ -28,12 +31,87 @@ def delete_model_by_recipe(request, pk, model):
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-def create_serializer_by_recipe(serializer, request, pk):
+@transaction.atomic
+def create_serializer_by_recipe(serializer, request, pk, **data):
     create_serializer = serializer(
-        data={'user': request.user.id, 'recipe': pk},
+        data={'user': request.user.id, 'recipe': pk, **data},
         context={'request': request})
     create_serializer.is_valid(raise_exception=True)
     create_serializer.save()
     return Response(
         create_serializer.data, status=status.HTTP_201_CREATED
     )
+
+
+def parse_ids(request, name):
+    """Список id из параметра вида ?name=1,2&name=3."""
+    ids = set()
+    for value in request.query_params.getlist(name):
+        for item in filter(None, value.split(',')):
+            if not item.isdigit():
+                raise serializers.ValidationError(
+                    {name: f'Некорректный id: {item}'})
+            ids.add(int(item))
+    if len(ids) > MAX_FLAGS_IDS:
+        raise serializers.ValidationError(
+            {name: f'Не больше {MAX_FLAGS_IDS} id за запрос'})
+    return ids
+
+
+def parse_positive_int(request, name):
+    """Необязательный целый положительный query-параметр."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    if not value.isdigit() or not int(value):
+        raise serializers.ValidationError(
+            {name: 'Ожидается целое положительное число'})
+    return int(value)
+
+
+def parse_fields(request, available):
+    """
+    Поля ответа из ?fields=a,b и ?omit=c; без параметров — все поля.
+    """
+    fields = set(available)
+    for name in ('fields', 'omit'):
+        value = request.query_params.get(name)
+        if not value:
+            continue
+        requested = set(filter(None, value.split(',')))
+        unknown = requested - set(available)
+        if unknown:
+            raise serializers.ValidationError(
+                {name: f'Неизвестные поля: {", ".join(sorted(unknown))}'})
+        if name == 'fields':
+            fields &= requested
+        else:
+            fields -= requested
+    return fields
+
+
+def batch_related_ids(request, model, column, ids):
+    """
+    Which of ids are linked to the current user through model.
+
+    Inside a batch answers are kept for the whole batch, so only ids not
+    seen by an earlier sub-request are queried; outside a batch — None.
+    """
+    shared = getattr(request, 'shared_cache', None)
+    if shared is None:
+        return None
+    known = shared.setdefault((model._meta.label, column), {})
+    missing = set(ids) - known.keys()
+    if missing:
+        related = set(
+            model.objects
+            .filter(user=request.user, **{f'{column}__in': missing})
+            .values_list(column, flat=True)
+        )
+        known.update((pk, pk in related) for pk in missing)
+    return {pk for pk in ids if known[pk]}
+
+
+def is_public_request(request):
+    """Запрошено общее для всех пользователей представление."""
+    return request.query_params.get('public', '').lower() in ('1', 'true')
@@ -1,45 +1,84 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import permissions, status, viewsets
+from rest_framework import (
+    generics, permissions, serializers, status, viewsets
+)
 from rest_framework.decorators import action
 from rest_framework.permissions import (
     SAFE_METHODS, IsAuthenticated, IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
 
+from api.batch import run_batch
+from api.cache import (
+    FACETS_IGNORED_PARAMS, FACETS_KEY_PREFIX, cache_for_anonymous,
+    conditional_for_anonymous, filter_key, recipe_detail_key,
+    recipe_detail_validators, recipe_list_key, recipe_list_validators
+)
+from api.catalogue import ingredient_catalogue, tag_catalogue
+from api.changes import compact, latest_cursor, oldest_cursor, read_changes
 from api.filters import IngredientFilter, RecipeFilter
+from api.pantry import pantry_index
 from api.paginations import CustomPagination
 from api.permissions import AuthorOrReadOnly
+from api.projections import RecipeProjection
 from api.serializers import (
-    FavoriteCreateDeleteSerializer, IngredientSerializer,
-    RecipeCreateSerializer, RecipeReadSerializer,
+    BatchSerializer, FavoriteCreateDeleteSerializer, IngredientSerializer,
+    RecipeCreateSerializer, RecipeReadSerializer, RecipeShortSerializer,
     ShoppingCartCreateDeleteSerializer, SubscribeCreateSerializer,
     SubscribeSerializer, TagSerializer
 )
 from api.utils import (
     generate_shopping_cart, delete_model_by_recipe,
-    create_serializer_by_recipe
+    create_serializer_by_recipe, is_public_request, parse_fields, parse_ids,
+    parse_positive_int
 )
+from api.throttling import RateLimitHeadersMixin
+from recipes.constants import (
+    THROTTLE_COST_DOWNLOAD, THROTTLE_COST_FLAG, THROTTLE_COST_IMAGE,
+    THROTTLE_COST_RECIPE
+)
+from recipes.deletion import delete_recipe, delete_user
 from recipes.models import (
     AmountIngredient, Favorite, Ingredient,
-    Recipe, ShoppingCart, Tag
+    Recipe, ShoppingCart, Tag, UnitConversion
 )
 from users.models import Subscription, User
 
 
-class UserViewSet(UserViewSet):
+class UserViewSet(RateLimitHeadersMixin, UserViewSet):
     """ViewSet модели User"""
-    queryset = User.objects.all()
+    queryset = User.objects.filter(is_active=True)
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = CustomPagination
+    throttle_costs = {
+        'subscribe': THROTTLE_COST_FLAG,
+        'delete_subscribe': THROTTLE_COST_FLAG,
+    }
 
     def get_permissions(self):
         if self.action == 'me':
             return [IsAuthenticated()]
         return super().get_permissions()
 
+    def perform_destroy(self, instance):
+        delete_user(instance)
+
+    def get_count_versions(self, request):
+        """Счётчики, от которых зависит число пользователей в выдаче."""
+        if self.action == 'subscriptions':
+            return ['user', f'subscription:{request.user.pk}']
+        return ['user']
+
     @action(
         methods=['post'],
         detail=True,
@@ -50,7 +89,8 @@ class UserViewSet(UserViewSet):
             data={'user': request.user.id, 'author': id},
             context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
@@ -66,11 +106,19 @@ class UserViewSet(UserViewSet):
         permission_classes=[permissions.IsAuthenticated]
     )
     def subscriptions(self, request):
+        fields = parse_fields(request, SubscribeSerializer.Meta.fields)
+        columns = fields & {'email', 'username', 'first_name', 'last_name'}
         subscriptions = User.objects.filter(
-            author__user=request.user)
+            author__user=request.user, is_active=True).only('id', *columns)
+        if 'recipes_count' in fields:
+            # С GROUP BY Meta.ordering не применяется.
+            subscriptions = subscriptions.annotate(
+                recipes_count=Count(
+                    'recipes', filter=Q(recipes__deleted_at__isnull=True))
+            ).order_by('username')
         page = self.paginate_queryset(subscriptions)
         serializer = SubscribeSerializer(
-            page, many=True, context={'request': request})
+            page, many=True, context={'request': request, 'fields': fields})
         return self.get_paginated_response(serializer.data)
 
 
@@ -83,6 +131,15 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по началу названия в закешированном каталоге."""
+        name = request.query_params.get('name', '').lower()
+        return Response([
+            ingredient
+            for lowered, ingredient in ingredient_catalogue.get()
+            if lowered.startswith(name)
+        ])
+
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet модели Tag."""
@@ -91,8 +148,11 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return Response(tag_catalogue.get())
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(RateLimitHeadersMixin, viewsets.ModelViewSet):
     """ViewSet модели Recipe."""
 
     queryset = Recipe.objects.select_related('author').prefetch_related(
@@ -101,12 +161,193 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    throttle_costs = {
+        'create': THROTTLE_COST_RECIPE,
+        'update': THROTTLE_COST_RECIPE,
+        'partial_update': THROTTLE_COST_RECIPE,
+        'favorite': THROTTLE_COST_FLAG,
+        'delete_favorite': THROTTLE_COST_FLAG,
+        'shopping_cart': THROTTLE_COST_FLAG,
+        'update_shopping_cart': THROTTLE_COST_FLAG,
+        'delete_shopping_cart': THROTTLE_COST_FLAG,
+        'download_shopping_cart': THROTTLE_COST_DOWNLOAD,
+    }
+
+    def get_throttle_cost(self, request):
+        """Картинка декодируется и сохраняется, она стоит отдельно."""
+        cost = self.throttle_costs.get(self.action, 0)
+        if (self.action in ('create', 'update', 'partial_update')
+                and 'image' in request.data):
+            cost += THROTTLE_COST_IMAGE
+        return cost
+
+    def get_queryset(self):
+        if self.action == 'destroy':
+            return Recipe.objects.only('pk', 'name', 'author')
+        return super().get_queryset()
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
+    def perform_destroy(self, instance):
+        """Рецепт скрывается сразу, строки удаляются в фоне."""
+        delete_recipe(instance)
+
+    def perform_authentication(self, request):
+        """
+        With ?public=1 list and detail are rendered as for an anonymous
+        visitor and share its cache; per-user flags come from `flags`.
+        """
+        super().perform_authentication(request)
+        if (self.action in ('list', 'retrieve')
+                and is_public_request(request)):
+            request.user = AnonymousUser()
+
+    def get_count_versions(self, request):
+        """Счётчики, от которых зависит число рецептов в выдаче."""
+        names = ['recipes', 'tag']
+        if request.user.is_authenticated:
+            if 'is_favorited' in request.query_params:
+                names.append(f'favorite:{request.user.pk}')
+            if 'is_in_shopping_cart' in request.query_params:
+                names.append(f'shopping_cart:{request.user.pk}')
+        return names
+
+    @conditional_for_anonymous(recipe_list_validators, recipe_list_key)
+    @cache_for_anonymous(recipe_list_key)
+    def list(self, request, *args, **kwargs):
+        ids = 'ids' in request.query_params
+        if ids and not parse_ids(request, 'ids'):
+            raise serializers.ValidationError(
+                {'ids': 'Укажите хотя бы один id'})
+        projection = RecipeProjection(request)
+        queryset = projection.values(self.filter_queryset(self.get_queryset()))
+        if ids:
+            return Response(projection.represent(queryset))
+        facets = request.query_params.get('facets')
+        if facets not in (None, 'tags'):
+            raise serializers.ValidationError(
+                {'facets': 'Поддерживаются только facets=tags'})
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(projection.represent(queryset))
+        response = self.get_paginated_response(projection.represent(page))
+        if facets:
+            response.data['facets'] = {'tags': self.get_tag_facets(request)}
+        return response
+
+    def get_tag_facets(self, request):
+        """
+        Число рецептов с каждым тегом при остальных фильтрах выдачи.
+
+        Фильтр по тегам при подсчёте не учитывается: теги объединяются
+        через ИЛИ, и выбор ещё одного тега расширяет выдачу.
+        """
+        key = filter_key(
+            FACETS_KEY_PREFIX, request, self.get_count_versions(request),
+            FACETS_IGNORED_PARAMS)
+        counts = cache.get(key)
+        if counts is None:
+            data = request.query_params.copy()
+            data.pop('tags', None)
+            recipes = self.filterset_class(
+                data, Recipe.objects.all(), request=request).qs
+            counts = dict(
+                Recipe.tags.through.objects
+                .filter(recipe__in=recipes.order_by().values('pk'))
+                .values_list('tag_id')
+                .annotate(count=Count('pk'))
+                .order_by()
+            )
+            cache.set(key, counts, settings.CACHE_TIMEOUT)
+        return [
+            {'id': tag['id'], 'slug': tag['slug'],
+             'count': counts.get(tag['id'], 0)}
+            for tag in tag_catalogue.get()
+        ]
+
+    @conditional_for_anonymous(recipe_detail_validators, recipe_detail_key)
+    @cache_for_anonymous(recipe_detail_key)
+    def retrieve(self, request, *args, **kwargs):
+        projection = RecipeProjection(request)
+        queryset = projection.values(self.filter_queryset(self.get_queryset()))
+        recipe = generics.get_object_or_404(
+            queryset, pk=kwargs[self.lookup_field])
+        self.check_object_permissions(request, recipe)
+        return Response(projection.represent([recipe])[0])
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def flags(self, request):
+        """Флаги текущего пользователя для переданных рецептов и авторов."""
+        recipe_ids = parse_ids(request, 'recipes')
+        author_ids = parse_ids(request, 'authors')
+        subscribed, favorited, in_cart = RecipeProjection(request).get_flags(
+            recipe_ids, author_ids)
+        return Response({
+            'recipes': [
+                {
+                    'id': recipe_id,
+                    'is_favorited': recipe_id in favorited,
+                    'is_in_shopping_cart': recipe_id in in_cart,
+                }
+                for recipe_id in sorted(recipe_ids)
+            ],
+            'authors': [
+                {'id': author_id, 'is_subscribed': author_id in subscribed}
+                for author_id in sorted(author_ids)
+            ],
+        })
+
+    @action(methods=['get'], detail=False)
+    def pantry(self, request):
+        """Что приготовить из имеющихся ингредиентов."""
+        ingredient_ids = parse_ids(request, 'ingredients')
+        if not ingredient_ids:
+            raise serializers.ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент'})
+        slugs = set(request.query_params.getlist('tags'))
+        tag_ids = None
+        if slugs:
+            tag_ids = {
+                tag['id'] for tag in tag_catalogue.get()
+                if tag['slug'] in slugs
+            }
+        matches = pantry_index.search(
+            ingredient_ids, tag_ids,
+            parse_positive_int(request, 'max_cooking_time'))
+        page = self.paginate_queryset(matches)
+        projection = RecipeProjection(request)
+        rows = {
+            row['id']: row
+            for row in projection.values(
+                Recipe.objects.filter(pk__in=[item[0] for item in page]))
+        }
+        page = [item for item in page if item[0] in rows]
+        data = projection.represent(rows[item[0]] for item in page)
+        for recipe, (_, matched, total) in zip(data, page):
+            recipe['coverage'] = round(matched / total, 4)
+            recipe['missing_ingredients'] = total - matched
+        return self.get_paginated_response(data)
+
+    @action(methods=['get'], detail=True)
+    def similar(self, request, pk=None):
+        """Похожие рецепты из заранее посчитанного индекса."""
+        recipe = generics.get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        queryset = (
+            Recipe.objects
+            .filter(similar_to__recipe=recipe)
+            .order_by('-similar_to__score', '-pk')
+        )
+        serializer = RecipeShortSerializer(
+            queryset, many=True, context={'request': request})
+        return Response(serializer.data)
+
     @action(
         methods=['post'],
         detail=True,
@@ -129,11 +370,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticated]
     )
     def shopping_cart(self, request, pk=None):
-        """Добавить рецепт в список покупок."""
+        """Добавить рецепт в список покупок, можно с множителем порций."""
+        data = {}
+        if 'servings' in request.data:
+            data['servings'] = request.data['servings']
         return create_serializer_by_recipe(
-            ShoppingCartCreateDeleteSerializer, request, pk
+            ShoppingCartCreateDeleteSerializer, request, pk, **data
         )
 
+    @shopping_cart.mapping.patch
+    def update_shopping_cart(self, request, pk=None):
+        """Изменить множитель порций рецепта в списке покупок."""
+        shopping_cart = get_object_or_404(
+            ShoppingCart, user=request.user, recipe_id=pk)
+        serializer = ShoppingCartCreateDeleteSerializer(
+            shopping_cart, data={'servings': request.data.get('servings')},
+            partial=True, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk=None):
         """Удалить рецепт из списка покупок"""
@@ -145,11 +401,70 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticated]
     )
     def download_shopping_cart(self, request):
+        """
+        Суммы по ингредиентам с учётом множителя порций, переведённые
+        в основные единицы (UnitConversion) одним агрегирующим запросом.
+        """
+        conversion = UnitConversion.objects.filter(
+            unit=OuterRef('ingredient__measurement_unit'))
         return generate_shopping_cart(
-            AmountIngredient.objects.select_related('recipe', 'ingredient')
-            .filter(recipe__recipes_shoppingcart_related__user=request.user)
-            .values_list(
-                'ingredient__name',
-                'ingredient__measurement_unit')
-            .annotate(amount=Sum('amount'))
-            .order_by('ingredient__name'))
+            AmountIngredient.objects
+            .filter(recipe__recipes_shoppingcart_related__user=request.user,
+                    recipe__deleted_at__isnull=True)
+            .annotate(
+                unit=Coalesce(
+                    Subquery(conversion.values('canonical_unit')),
+                    F('ingredient__measurement_unit')),
+                factor=Coalesce(
+                    Subquery(conversion.values('factor')), Value(1)),
+            )
+            .values_list('ingredient__name', 'unit')
+            .annotate(amount=Sum(
+                F('amount') * F('factor')
+                * F('recipe__recipes_shoppingcart_related__servings'),
+                output_field=IntegerField()))
+            .order_by('ingredient__name', 'unit'))
+
+
+class ChangeViewSet(viewsets.GenericViewSet):
+    """
+    Изменения после курсора ?since= из журнала изменений; 410, если
+    часть из них уже удалена по сроку хранения.
+    """
+
+    pagination_class = None
+
+    def list(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response(
+                {'cursor': latest_cursor(), 'has_more': False, 'changes': []})
+        if not since.isdigit():
+            raise serializers.ValidationError(
+                {'since': 'Курсор должен быть целым числом'})
+        if int(since) < oldest_cursor():
+            return Response({
+                'detail': 'События после курсора уже удалены, '
+                          'загрузите данные заново',
+                'cursor': latest_cursor(),
+            }, status=status.HTTP_410_GONE)
+        changes, cursor, has_more = read_changes(int(since))
+        return Response({
+            'cursor': cursor,
+            'has_more': has_more,
+            'changes': compact(changes, request.user),
+        })
+
+
+class BatchViewSet(viewsets.GenericViewSet):
+    """Несколько GET-запросов к api одним POST."""
+
+    serializer_class = BatchSerializer
+    pagination_class = None
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(run_batch(request, [
+            item['url'] for item in serializer.validated_data['requests']
+        ]))
@@ -0,0 +1,40 @@
+import logging
+
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+
+from api import serializers
+from api.catalogue import ingredient_catalogue, tag_catalogue
+from api.pantry import pantry_index
+
+logger = logging.getLogger(__name__)
+
+SERIALIZERS = (
+    serializers.UserSerializer,
+    serializers.SubscribeSerializer,
+    serializers.TagSerializer,
+    serializers.IngredientSerializer,
+    serializers.RecipeReadSerializer,
+    serializers.RecipeCreateSerializer,
+    serializers.RecipeShortSerializer,
+)
+
+
+def warm_up():
+    """
+    Fill process caches before gunicorn forks the workers.
+
+    Workers then share the warmed memory copy-on-write. Database
+    connections are closed at the end so no socket is inherited.
+    """
+    get_resolver().url_patterns
+    for serializer_class in SERIALIZERS:
+        serializer_class().fields
+    try:
+        tag_catalogue.get()
+        ingredient_catalogue.get()
+        pantry_index.refresh()
+    except DatabaseError:
+        logger.warning('Каталог не прогрет: база данных недоступна')
+    finally:
+        connections.close_all()
@@ -4,4 +4,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Модули api импортируются после настройки Django.
+from api.events import EVENTS_PATH, event_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Поток событий обслуживается в обход Django, остальное — Django."""
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        await event_stream(scope, receive, send)
+        return
+    await django_application(scope, receive, send)
@@ -0,0 +1,79 @@
+import os
+import threading
+
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, size, conn_params):
+    """Пул соединений процесса; после fork создаётся новый."""
+    key = (os.getpid(), alias)
+    with pools_lock:
+        if key not in pools:
+            pools[key] = ThreadedConnectionPool(size, size, **conn_params)
+        return pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend with pre-use health checks and an optional pool.
+
+    CONN_HEALTH_CHECKS: a persistent connection is pinged once per request
+    before its first use and reopened if the server dropped it.
+    POOL_SIZE: connections are borrowed from a per-process pool of that
+    size and returned to it instead of being closed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.pool = None
+
+    def get_new_connection(self, conn_params):
+        size = self.settings_dict.get('POOL_SIZE')
+        if not size:
+            return super().get_new_connection(conn_params)
+        pool = get_pool(self.alias, size, conn_params)
+        try:
+            connection = pool.getconn()
+        except PoolError:
+            return super().get_new_connection(conn_params)
+        self.pool = pool
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def connect(self):
+        # set_autocommit() inside connect() calls ensure_connection().
+        self.health_check_done = True
+        super().connect()
+
+    def ensure_connection(self):
+        if (self.connection is not None
+                and self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.health_check_done
+                and not self.in_atomic_block):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def _close(self):
+        if self.pool is None:
+            return super()._close()
+        pool, self.pool = self.pool, None
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
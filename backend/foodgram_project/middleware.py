@@ -0,0 +1,59 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from api.changes import change_listener
+from foodgram_project.routers import use_replica
+
+
+def sticky_key(request):
+    credentials = request.META.get('HTTP_AUTHORIZATION', '')
+    if not credentials:
+        return None
+    digest = hashlib.md5(credentials.encode()).hexdigest()
+    return f'foodgram:db:primary:{digest}'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Enable replica reads for safe requests to the api.
+
+    After a successful write the client sticks to the primary for
+    DB_STICKY_SECONDS, so it reads its own writes. The flag lives in the
+    Django cache, which must be shared between workers (api.E002).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        key = sticky_key(request)
+        safe = request.method in SAFE_METHODS
+        token = use_replica.set(
+            safe
+            and request.path.startswith('/api/')
+            and not (key and cache.get(key))
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if key and not safe and response.status_code < 400:
+            cache.set(key, True, settings.DB_STICKY_SECONDS)
+        return response
+
+
+class ChangeLogMiddleware:
+    """Подтянуть изменения других воркеров в кеши этого процесса."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.CHANGES_INVALIDATION:
+            change_listener.poll()
+        return self.get_response(request)
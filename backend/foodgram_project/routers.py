@@ -0,0 +1,50 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+use_replica = ContextVar('use_replica', default=False)
+
+replica_down_until = {}
+
+
+def choose_replica():
+    """
+    Pick a reachable replica, falling back to the primary.
+
+    A replica that failed to connect is skipped for DB_REPLICA_RETRY
+    seconds.
+    """
+    now = time.monotonic()
+    replicas = [
+        alias for alias in settings.DATABASE_REPLICAS
+        if replica_down_until.get(alias, 0) <= now
+    ]
+    random.shuffle(replicas)
+    for alias in replicas:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            replica_down_until[alias] = now + settings.DB_REPLICA_RETRY
+            continue
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """Чтение с реплик для безопасных запросов к api, запись в основную БД."""
+
+    def db_for_read(self, model, **hints):
+        if (not use_replica.get()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        use_replica.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
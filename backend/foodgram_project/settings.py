@@ -30,10 +30,13 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram_project.middleware.ReplicaRoutingMiddleware',
+    'foodgram_project.middleware.ChangeLogMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -72,15 +75,69 @@ if os.getenv('DATABASES') == 'sqlite':
 else:
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'foodgram_project.backends.postgresql',
             'NAME': os.getenv('DB_NAME', default='postgres'),
             'USER': os.getenv('POSTGRES_USER', default='postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
             'HOST': os.getenv('DB_HOST', default='db'),
-            'PORT': os.getenv('DB_PORT', default='5432')
+            'PORT': os.getenv('DB_PORT', default='5432'),
+            'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', default='True').lower() == 'true',
+            'POOL_SIZE': int(os.getenv('DB_POOL_SIZE', default=0)),
         }
     }
 
+DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', default=60))
+
+DATABASE_REPLICAS = []
+
+for number, location in enumerate(filter(None, os.getenv('DB_REPLICAS', default='').replace(' ', '').split(',')), start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        ('NAME' if os.getenv('DATABASES') == 'sqlite' else 'HOST'): location,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram_project.routers.ReplicaRouter']
+
+DB_STICKY_SECONDS = int(os.getenv('DB_STICKY_SECONDS', default=5))
+
+DB_REPLICA_RETRY = int(os.getenv('DB_REPLICA_RETRY', default=30))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+LOCAL_CACHE = CACHES['default']['BACKEND'].endswith('LocMemCache')
+
+REDIS_CACHE = CACHES['default']['BACKEND'] == 'django_redis.cache.RedisCache'
+
+CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', default=60 if LOCAL_CACHE else 0)) or None
+
+CHANGES_DELAY = float(os.getenv('CHANGES_DELAY', default=5))
+
+CHANGES_POLL_INTERVAL = float(os.getenv('CHANGES_POLL_INTERVAL', default=1))
+
+CHANGES_KEEP_DAYS = int(os.getenv('CHANGES_KEEP_DAYS', default=7))
+
+CHANGES_INVALIDATION = os.getenv('CHANGES_INVALIDATION', default=str(LOCAL_CACHE)).lower() == 'true'
+
+EVENTS_BROKER = os.getenv('EVENTS_BROKER', default='api.events.LocalBroker')
+
+EVENTS_KEEPALIVE = float(os.getenv('EVENTS_KEEPALIVE', default=15))
+
+JOBS_THREADS = int(os.getenv('JOBS_THREADS', default=2))
+
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', default=1))
+
+JOBS_STALE_AFTER = int(os.getenv('JOBS_STALE_AFTER', default=3600))
+
+PAGINATION_COUNT_THRESHOLD = int(os.getenv('PAGINATION_COUNT_THRESHOLD', default=100000))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -118,13 +175,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', default=1024))
+
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', default=300))
+
+JWT_AUTH = os.getenv('JWT_AUTH', default='False').lower() == 'true'
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ] + (['api.authentication.CachedJWTAuthentication'] if JWT_AUTH else []),
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.CostThrottle',
     ],
+    'DEFAULT_THROTTLE_RATES': {
+        'cost': os.getenv('THROTTLE_RATE', default='60/min' if REDIS_CACHE else '') or None,
+    },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGINATE_BY_PARAM': 'limit',
 }
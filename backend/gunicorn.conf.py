@@ -0,0 +1,43 @@
+import math
+import os
+
+cores = (
+    len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity')
+    else os.cpu_count()
+)
+
+bind = os.getenv('GUNICORN_BIND', default='0.0.0.0:8000')
+
+workers = int(os.getenv('GUNICORN_WORKERS', default=cores + 1))
+
+# Около четырёх потоков на ядро на все воркеры: запросы api в основном
+# ждут БД, а не процессор.
+threads = int(os.getenv(
+    'GUNICORN_THREADS', default=max(2, math.ceil(4 * cores / workers))))
+
+asgi = os.getenv('ASGI', default='False').lower() == 'true'
+
+if asgi:
+    # Сервис потока событий (/api/events/), api обслуживает gthread.
+    wsgi_app = 'foodgram_project.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram_project.wsgi:application'
+    worker_class = 'gthread' if threads > 1 else 'sync'
+
+preload_app = True
+
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=1000))
+
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+
+accesslog = '-'
+
+
+def when_ready(server):
+    """Вызывается в мастер-процессе после загрузки приложения, до fork."""
+    from api.warmup import warm_up
+
+    warm_up()
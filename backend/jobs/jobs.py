@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import job
+from recipes.constants import JOB_KEEP_DAYS
+
+
+@job('jobs.cleanup', periodic=timedelta(days=1))
+def cleanup():
+    """Удалить выполненные задачи старше JOB_KEEP_DAYS дней."""
+    Job.objects.filter(
+        status=Job.DONE,
+        finished_at__lt=timezone.now() - timedelta(days=JOB_KEEP_DAYS),
+    ).delete()
@@ -0,0 +1,45 @@
+import signal
+from multiprocessing import Process
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import serve
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers until SIGTERM.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=settings.JOBS_THREADS,
+            help='Worker threads per process.')
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Worker processes, each with --threads threads.')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        poll_interval = settings.JOBS_POLL_INTERVAL
+        self.stdout.write(self.style.SUCCESS(
+            f'Воркеры запущены: {options["processes"]} x {threads}'))
+        if options['processes'] == 1:
+            serve(threads, poll_interval)
+            return
+        connections.close_all()
+        processes = [
+            Process(target=serve, args=(threads, poll_interval))
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        def stop(*args):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
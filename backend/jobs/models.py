@@ -0,0 +1,94 @@
+from django.db import models
+from django.utils import timezone
+
+from recipes.constants import JOB_MAX_ATTEMPTS, MAX_LEN_KIND, MAX_LEN_TITLE
+
+
+class Job(models.Model):
+    """
+    Background job stored in the database (see jobs.queue).
+
+    At most one queued job may carry a given dedup_key.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        verbose_name='Задача',
+        max_length=MAX_LEN_TITLE,
+    )
+    payload = models.JSONField(
+        verbose_name='Параметры',
+        default=dict,
+        blank=True,
+    )
+    dedup_key = models.CharField(
+        verbose_name='Ключ дедупликации',
+        max_length=MAX_LEN_TITLE,
+        null=True,
+        blank=True,
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=MAX_LEN_KIND,
+        choices=STATUSES,
+        default=QUEUED,
+    )
+    run_at = models.DateTimeField(
+        verbose_name='Запустить не раньше',
+        default=timezone.now,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток',
+        default=0,
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток',
+        default=JOB_MAX_ATTEMPTS,
+    )
+    last_error = models.TextField(
+        verbose_name='Последняя ошибка',
+        blank=True,
+    )
+    locked_at = models.DateTimeField(
+        verbose_name='Взята в работу',
+        null=True,
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Создана',
+        auto_now_add=True,
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='Завершена',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ('-created_at',)
+        indexes = (
+            models.Index(fields=('status', 'run_at'),
+                         name='job_status_run_at'),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('dedup_key',),
+                condition=models.Q(status='queued'),
+                name='unique_queued_job_dedup_key',
+            ),
+        )
+
+    def __str__(self):
+        return '{} {}'.format(self.name, self.status)
@@ -0,0 +1,148 @@
+"""
+A small job queue on top of the Job table.
+
+Functions are registered with `job()` in `<app>/jobs.py` modules, which
+are imported when the app registry is ready, and queued with `enqueue()`,
+inside the caller's transaction. `run_workers` claims due jobs, retries
+failures with exponential backoff and keeps one queued run of every
+periodic job.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from jobs.models import Job
+from recipes.constants import JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+
+    def __init__(self, name, func, periodic, max_attempts):
+        self.name = name
+        self.func = func
+        self.periodic = periodic
+        self.max_attempts = max_attempts
+
+    @property
+    def periodic_key(self):
+        return f'periodic:{self.name}'
+
+
+def job(name, periodic=None, max_attempts=JOB_MAX_ATTEMPTS):
+    """Зарегистрировать функцию как задачу; periodic — интервал запусков."""
+    def decorator(func):
+        registry[name] = Task(name, func, periodic, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, dedup_key=None, delay=None, run_at=None):
+    """
+    Queue a job; payload is passed to the function as keyword arguments.
+
+    With a dedup_key an already queued job is reused instead, moved
+    earlier if the new one is due sooner.
+    """
+    task = registry[name]
+    if run_at is None:
+        run_at = timezone.now() + (delay or timedelta())
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name, payload=payload or {}, dedup_key=dedup_key,
+                run_at=run_at, max_attempts=task.max_attempts)
+    except IntegrityError:
+        if dedup_key is None:
+            raise
+    queued = Job.objects.filter(dedup_key=dedup_key, status=Job.QUEUED)
+    queued.filter(run_at__gt=run_at).update(run_at=run_at)
+    return queued.first()
+
+
+def claim():
+    """Взять одну готовую к запуску задачу или вернуть None."""
+    now = timezone.now()
+    with transaction.atomic():
+        pk = (
+            Job.objects
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('run_at')
+            .select_for_update(skip_locked=True)
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if pk is None:
+            return None
+        # Без SKIP LOCKED (SQLite) задачу мог забрать другой поток.
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1)
+    if not claimed:
+        return None
+    return Job.objects.get(pk=pk)
+
+
+def requeue(job, **fields):
+    """
+    Вернуть задачу в очередь; если её ключ уже занят новой задачей,
+    эта считается проваленной — работу сделает новая.
+    """
+    try:
+        with transaction.atomic():
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.QUEUED, locked_at=None, **fields)
+    except IntegrityError:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED, finished_at=timezone.now(), **fields)
+
+
+def execute(job):
+    task = registry.get(job.name)
+    try:
+        if task is None:
+            raise LookupError(f'Задача {job.name} не зарегистрирована')
+        task.func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Задача %s #%s упала:\n%s', job.name, job.pk, error)
+        if task is not None and job.attempts < job.max_attempts:
+            delay = JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            requeue(job, last_error=error,
+                    run_at=timezone.now() + timedelta(seconds=delay))
+            return
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED, finished_at=timezone.now(), last_error=error)
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.DONE, finished_at=timezone.now(), last_error='')
+    if task is not None and task.periodic:
+        enqueue(task.name, dedup_key=task.periodic_key, delay=task.periodic)
+
+
+def schedule_periodic():
+    """Поставить периодические задачи, у которых нет ожидающего запуска."""
+    for task in registry.values():
+        if task.periodic is None:
+            continue
+        pending = Job.objects.filter(
+            dedup_key=task.periodic_key,
+            status__in=(Job.QUEUED, Job.RUNNING),
+        )
+        if not pending.exists():
+            enqueue(task.name, dedup_key=task.periodic_key)
+
+
+def requeue_stale():
+    """Задачи упавшего воркера возвращаются в очередь после таймаута."""
+    deadline = timezone.now() - timedelta(seconds=settings.JOBS_STALE_AFTER)
+    for job in Job.objects.filter(status=Job.RUNNING, locked_at__lt=deadline):
+        logger.warning('Задача %s #%s зависла, повтор', job.name, job.pk)
+        requeue(job)
@@ -0,0 +1,130 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import (claim, enqueue, execute, job, registry, requeue_stale,
+                        schedule_periodic)
+from recipes.constants import JOB_RETRY_DELAY
+
+
+class JobQueueTests(TestCase):
+    """claim/execute напрямую, без потоков воркера."""
+
+    def setUp(self):
+        patcher = mock.patch.dict(registry, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = []
+        job('test.record')(self.record)
+        job('test.fail', max_attempts=2)(self.fail)
+        job('test.periodic', periodic=timedelta(hours=1))(self.record)
+
+    def record(self, **payload):
+        self.calls.append(payload)
+
+    def fail(self):
+        raise ValueError('сломалось')
+
+    def make_due(self, queued):
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+
+    def assertAbout(self, moment, expected):
+        self.assertAlmostEqual(
+            moment, expected, delta=timedelta(seconds=5))
+
+    def test_execute_passes_payload(self):
+        queued = enqueue('test.record', {'recipe_id': 1})
+        claimed = claim()
+        self.assertEqual(claimed.pk, queued.pk)
+        self.assertEqual(claimed.status, Job.RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(claim())
+        execute(claimed)
+        self.assertEqual(self.calls, [{'recipe_id': 1}])
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.DONE)
+
+    def test_retry_with_backoff_then_fail(self):
+        queued = enqueue('test.fail')
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            execute(claim())
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.QUEUED)
+        self.assertIn('сломалось', queued.last_error)
+        self.assertAbout(
+            queued.run_at,
+            timezone.now() + timedelta(seconds=JOB_RETRY_DELAY))
+        self.assertIsNone(claim(), 'retry is not due yet')
+        self.make_due(queued)
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            execute(claim())
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.FAILED)
+        self.assertEqual(queued.attempts, 2)
+        self.assertIsNotNone(queued.finished_at)
+
+    def test_unknown_task_fails_at_once(self):
+        queued = Job.objects.create(name='test.missing')
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            execute(claim())
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.FAILED)
+        self.assertIn('не зарегистрирована', queued.last_error)
+
+    def test_dedup_keeps_the_earliest_run(self):
+        first = enqueue('test.record', dedup_key='key',
+                        delay=timedelta(hours=1))
+        again = enqueue('test.record', dedup_key='key',
+                        delay=timedelta(minutes=10))
+        later = enqueue('test.record', dedup_key='key',
+                        delay=timedelta(hours=2))
+        self.assertEqual({first.pk, again.pk, later.pk}, {first.pk})
+        first.refresh_from_db()
+        self.assertAbout(first.run_at, timezone.now() + timedelta(minutes=10))
+        # Ключ свободен, пока задача выполняется.
+        self.make_due(first)
+        claim()
+        self.assertNotEqual(
+            enqueue('test.record', dedup_key='key').pk, first.pk)
+        enqueue('test.record')
+        enqueue('test.record')
+        self.assertEqual(Job.objects.count(), 4)
+
+    def test_requeue_stale(self):
+        stale = timezone.now() - timedelta(
+            seconds=settings.JOBS_STALE_AFTER + 1)
+        hung = enqueue('test.record', dedup_key='hung')
+        claim()
+        replaced = enqueue('test.record', dedup_key='replaced')
+        claim()
+        fresh = enqueue('test.record')
+        claim()
+        Job.objects.exclude(pk=fresh.pk).update(locked_at=stale)
+        enqueue('test.record', dedup_key='replaced')
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            requeue_stale()
+        hung.refresh_from_db()
+        self.assertEqual(hung.status, Job.QUEUED)
+        self.assertIsNone(hung.locked_at)
+        # Ключ занят новой задачей: зависшая считается проваленной.
+        self.assertEqual(
+            Job.objects.get(pk=replaced.pk).status, Job.FAILED)
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, Job.RUNNING)
+
+    def test_periodic_schedule(self):
+        schedule_periodic()
+        schedule_periodic()
+        periodic = Job.objects.get(name='test.periodic')
+        self.assertEqual(periodic.dedup_key, 'periodic:test.periodic')
+        execute(claim())
+        self.assertEqual(
+            Job.objects.get(pk=periodic.pk).status, Job.DONE)
+        next_run = Job.objects.get(
+            name='test.periodic', status=Job.QUEUED)
+        self.assertAbout(next_run.run_at, timezone.now() + timedelta(hours=1))
+        schedule_periodic()
+        self.assertEqual(
+            Job.objects.filter(name='test.periodic').count(), 2)
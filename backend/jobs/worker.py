@@ -0,0 +1,57 @@
+import logging
+import signal
+import threading
+import time
+
+from django.db import DatabaseError, close_old_connections, connections
+
+from jobs.queue import claim, execute, requeue_stale, schedule_periodic
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL = 60
+
+
+def work(stop, poll_interval):
+    """Цикл одного потока: взять задачу, выполнить, подождать."""
+    next_maintenance = 0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                if time.monotonic() >= next_maintenance:
+                    next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+                    requeue_stale()
+                    schedule_periodic()
+                job = claim()
+            except DatabaseError:
+                logger.exception('Очередь задач недоступна')
+                job = None
+            if job is None:
+                stop.wait(poll_interval)
+                continue
+            try:
+                execute(job)
+            except DatabaseError:
+                logger.exception('Не удалось сохранить итог задачи %s', job.pk)
+    finally:
+        connections.close_all()
+
+
+def serve(threads, poll_interval):
+    """
+    Run `threads` worker threads in this process until SIGTERM or SIGINT.
+    """
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    workers = [
+        threading.Thread(target=work, args=(stop, poll_interval), daemon=True)
+        for _ in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    while any(worker.is_alive() for worker in workers):
+        stop.wait(poll_interval)
+    for worker in workers:
+        worker.join()
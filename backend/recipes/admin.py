@@ -1,19 +1,67 @@
 from django.contrib import admin
+from django.core import checks
 
 from recipes.constants import ADMIN_INLINE_EXTRA
+from recipes.deletion import delete_recipe, dependents
 from recipes.models import (
-    AmountIngredient, Favorite, Ingredient,
-    Recipe, ShoppingCart, Tag
+    AmountIngredient, Deletion, Favorite, Ingredient,
+    Recipe, ShoppingCart, Tag, UnitConversion
 )
 
 
+class BackgroundDeletionAdmin(admin.ModelAdmin):
+    """
+    Admin whose deletes go through recipes.deletion: the object is hidden
+    and purged by a job. The confirmation page lists only the selected
+    objects instead of collecting every related row, but the delete
+    permission is still required for every registered model that has
+    dependent rows, as with Django's collector.
+
+    A subclass sets `deletion_function`, e.g. staticmethod(delete_recipe),
+    and `deletion_kind`, e.g. Deletion.RECIPE.
+    """
+
+    deletion_function = None
+    deletion_kind = None
+
+    def check(self, **kwargs):
+        errors = super().check(**kwargs)
+        if self.deletion_function is None or self.deletion_kind is None:
+            errors.append(checks.Error(
+                f'{type(self).__name__} must set deletion_function '
+                f'and deletion_kind.',
+                obj=type(self), id='recipes.E001'))
+        return errors
+
+    def get_deleted_objects(self, objs, request):
+        perms_needed = set()
+        for obj in objs:
+            for queryset in dependents(self.deletion_kind, obj.pk):
+                opts = queryset.model._meta
+                model_admin = self.admin_site._registry.get(queryset.model)
+                if (model_admin is None
+                        or opts.verbose_name in perms_needed
+                        or model_admin.has_delete_permission(request)):
+                    continue
+                if queryset.exists():
+                    perms_needed.add(opts.verbose_name)
+        return [str(obj) for obj in objs], {}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        self.deletion_function(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.deletion_function(obj)
+
+
 class IngredientInRecipeInline(admin.TabularInline):
     model = AmountIngredient
     extra = ADMIN_INLINE_EXTRA
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(BackgroundDeletionAdmin):
     list_display = (
         'pk',
         'name',
@@ -33,6 +81,8 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('author', 'name', 'tags')
     inlines = [IngredientInRecipeInline]
     empty_value_display = '-пусто-'
+    deletion_function = staticmethod(delete_recipe)
+    deletion_kind = Deletion.RECIPE
 
     def count_favorite(self, obj):
         return obj.recipes_favorite_related.count()
@@ -52,6 +102,12 @@ class IngredientAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+@admin.register(UnitConversion)
+class UnitConversionAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'unit', 'canonical_unit', 'factor')
+    search_fields = ('unit', 'canonical_unit')
+
+
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'color', 'slug')
@@ -62,11 +118,37 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'user', 'recipe')
+    list_display = ('pk', 'user', 'recipe', 'created_at')
     search_fields = ('user__username', 'recipe__name',)
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'user', 'recipe')
+    list_display = ('pk', 'user', 'recipe', 'created_at')
     search_fields = ('user__username', 'recipe__name',)
+
+
+@admin.register(Deletion)
+class DeletionAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'kind', 'object_id', 'title', 'progress',
+        'created_at', 'finished_at'
+    )
+    list_filter = ('kind',)
+    search_fields = ('title',)
+    readonly_fields = (
+        'kind', 'object_id', 'title', 'total', 'deleted',
+        'created_at', 'finished_at'
+    )
+    empty_value_display = '-пусто-'
+
+    @admin.display(description='Прогресс')
+    def progress(self, obj):
+        if obj.finished_at is not None:
+            return '100%'
+        if not obj.total:
+            return None
+        return '{}%'.format(min(99, 100 * obj.deleted // obj.total))
+
+    def has_add_permission(self, request):
+        return False
@@ -2,6 +2,8 @@ MIN_AMOUNT = 1
 
 MAX_AMOUNT = 1000
 
+MAX_SERVINGS = 100
+
 MAX_HEX = 7
 
 MAX_LEN_EMAIL = 254
@@ -10,4 +12,50 @@ MAX_LEN_NAME = 150
 
 MAX_LEN_TITLE = 200
 
+MAX_LEN_KIND = 20
+
 ADMIN_INLINE_EXTRA = 1
+
+MAX_FLAGS_IDS = 100
+
+SIMILAR_RECIPES_LIMIT = 10
+
+SIMILAR_TAG_WEIGHT = 0.5
+
+TRENDING_DAYS = 7
+
+TRENDING_HALF_LIFE_DAYS = 2
+
+CHANGES_BATCH_SIZE = 500
+
+CHANGES_PRUNE_HOURS = 1
+
+CHANGES_PRUNE_BATCH_SIZE = 10000
+
+EVENTS_QUEUE_SIZE = 100
+
+EVENTS_RETRY = 3000
+
+JOB_MAX_ATTEMPTS = 3
+
+JOB_RETRY_DELAY = 30
+
+RANKINGS_REFRESH_MINUTES = 15
+
+SIMILAR_REBUILD_HOURS = 24
+
+JOB_KEEP_DAYS = 7
+
+BATCH_MAX_REQUESTS = 20
+
+DELETION_BATCH_SIZE = 1000
+
+DELETION_BATCHES_PER_JOB = 20
+
+THROTTLE_COST_FLAG = 1
+
+THROTTLE_COST_RECIPE = 1
+
+THROTTLE_COST_IMAGE = 4
+
+THROTTLE_COST_DOWNLOAD = 10
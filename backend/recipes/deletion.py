@@ -0,0 +1,124 @@
+"""
+Deletion of recipes and users in the background.
+
+Django's collector loads every dependent row and deletes them in one
+transaction, which for a prolific author locks the tables for long. Here
+the object is hidden at once (a recipe gets `deleted_at`, a user is
+deactivated) and the `recipes.purge` job removes its dependents in
+transactions of DELETION_BATCH_SIZE rows, children first, re-queueing
+itself every DELETION_BATCHES_PER_JOB batches.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from jobs.queue import enqueue
+from recipes.constants import (DELETION_BATCH_SIZE, DELETION_BATCHES_PER_JOB,
+                               MAX_LEN_TITLE)
+from recipes.models import (AmountIngredient, Deletion, Favorite, Recipe,
+                            RecipeDailyStats, RecipeDocument, RecipeRanking,
+                            ShoppingCart, SimilarRecipe)
+from users.models import Subscription, User
+
+recipes_hidden = Signal()
+
+
+def hide_recipes(queryset):
+    """Скрыть рецепты из всех выборок до их удаления."""
+    recipe_ids = list(queryset.values_list('pk', flat=True))
+    if recipe_ids:
+        queryset.update(deleted_at=timezone.now())
+        recipes_hidden.send(sender=Recipe, recipe_ids=recipe_ids)
+
+
+def schedule(kind, obj):
+    deletion, _ = Deletion.objects.get_or_create(
+        kind=kind, object_id=obj.pk, finished_at__isnull=True,
+        defaults={'title': str(obj)[:MAX_LEN_TITLE]},
+    )
+    enqueue('recipes.purge', {'deletion_id': deletion.pk},
+            dedup_key=f'purge:{deletion.pk}')
+    return deletion
+
+
+@transaction.atomic
+def delete_recipe(recipe):
+    hide_recipes(Recipe.objects.filter(pk=recipe.pk))
+    return schedule(Deletion.RECIPE, recipe)
+
+
+@transaction.atomic
+def delete_user(user):
+    """Деактивировать пользователя и скрыть его рецепты."""
+    hide_recipes(Recipe.objects.filter(author=user))
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    return schedule(Deletion.USER, user)
+
+
+def recipe_dependents(recipe_ids):
+    """Querysets to delete for the recipes, dependent rows first."""
+    return [
+        Favorite.objects.filter(recipe__in=recipe_ids),
+        ShoppingCart.objects.filter(recipe__in=recipe_ids),
+        AmountIngredient.objects.filter(recipe__in=recipe_ids),
+        Recipe.tags.through.objects.filter(recipe__in=recipe_ids),
+        SimilarRecipe.objects.filter(recipe__in=recipe_ids),
+        SimilarRecipe.objects.filter(similar__in=recipe_ids),
+        RecipeDailyStats.objects.filter(recipe__in=recipe_ids),
+        RecipeRanking.objects.filter(recipe__in=recipe_ids),
+        RecipeDocument.objects.filter(recipe__in=recipe_ids),
+        Recipe.all_objects.filter(pk__in=recipe_ids),
+    ]
+
+
+def dependents(kind, object_id):
+    if kind == Deletion.RECIPE:
+        return recipe_dependents([object_id])
+    user_id = object_id
+    return [
+        Favorite.objects.filter(user=user_id),
+        ShoppingCart.objects.filter(user=user_id),
+        Subscription.objects.filter(user=user_id),
+        Subscription.objects.filter(author=user_id),
+        *recipe_dependents(
+            Recipe.all_objects.filter(author=user_id).values('pk')),
+        User.objects.filter(pk=user_id),
+    ]
+
+
+def delete_batch(queryset):
+    """
+    Удалить до DELETION_BATCH_SIZE строк; сигналы post_delete (журнал
+    изменений, версии кеша) срабатывают как при обычном удалении.
+    """
+    pks = list(queryset.values_list('pk', flat=True)[:DELETION_BATCH_SIZE])
+    if not pks:
+        return 0
+    deleted, _ = queryset.model._base_manager.filter(pk__in=pks).delete()
+    return deleted
+
+
+def purge(deletion_id):
+    deletion = Deletion.objects.get(pk=deletion_id)
+    if deletion.finished_at is not None:
+        return
+    querysets = dependents(deletion.kind, deletion.object_id)
+    if deletion.total is None:
+        deletion.total = sum(queryset.count() for queryset in querysets)
+        deletion.save(update_fields=['total'])
+    for _ in range(DELETION_BATCHES_PER_JOB):
+        with transaction.atomic():
+            for queryset in querysets:
+                deleted = delete_batch(queryset)
+                if deleted:
+                    break
+            else:
+                Deletion.objects.filter(pk=deletion_id).update(
+                    finished_at=timezone.now())
+                return
+            Deletion.objects.filter(pk=deletion_id).update(
+                deleted=F('deleted') + deleted)
+    enqueue('recipes.purge', {'deletion_id': deletion_id},
+            dedup_key=f'purge:{deletion_id}')
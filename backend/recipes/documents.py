@@ -0,0 +1,144 @@
+"""
+Precomputed recipe documents, the read model of the recipe endpoints.
+
+A RecipeDocument holds everything in the recipe JSON that is the same
+for every reader: fields, tags, ingredients and the author without
+`is_subscribed`; the image is kept as the storage name. Nested objects
+are stored as value lists in the order of TAG_FIELDS, AUTHOR_FIELDS and
+INGREDIENT_FIELDS: jsonb on PostgreSQL does not keep key order. Writes that
+change a representation call `refresh_documents` in their transaction.
+A document whose `recipe_updated_at` does not match the recipe (an
+admin edit, a deleted tag) is rebuilt on read by `repair_documents`.
+"""
+import os
+from collections import defaultdict
+from multiprocessing import Pool
+
+from django.db import connections, transaction
+
+from recipes.models import AmountIngredient, Recipe, RecipeDocument
+
+REBUILD_CHUNK_SIZE = 1000
+
+TAG_FIELDS = ('id', 'name', 'slug', 'color')
+
+AUTHOR_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
+
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit', 'amount')
+
+
+def get_tags(recipe_ids):
+    tags = defaultdict(list)
+    rows = (
+        Recipe.tags.through.objects
+        .filter(recipe_id__in=recipe_ids)
+        .order_by('tag__name')
+        .values_list('recipe_id', *(f'tag__{name}' for name in TAG_FIELDS))
+    )
+    for recipe_id, *tag in rows:
+        tags[recipe_id].append(tag)
+    return tags
+
+
+def get_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    rows = (
+        AmountIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .order_by('recipe', 'pk')
+        .values_list('recipe_id', 'ingredient__id', 'ingredient__name',
+                     'ingredient__measurement_unit', 'amount')
+    )
+    for recipe_id, *ingredient in rows:
+        ingredients[recipe_id].append(ingredient)
+    return ingredients
+
+
+def build_documents(recipe_ids):
+    """Собрать документы рецептов: recipe id -> RecipeDocument."""
+    recipe_ids = list(recipe_ids)
+    rows = Recipe.all_objects.filter(pk__in=recipe_ids).values(
+        'id', 'name', 'text', 'cooking_time', 'image', 'updated_at',
+        *(f'author__{name}' for name in AUTHOR_FIELDS),
+    )
+    tags = get_tags(recipe_ids)
+    ingredients = get_ingredients(recipe_ids)
+    return {
+        row['id']: RecipeDocument(
+            recipe_id=row['id'],
+            recipe_updated_at=row['updated_at'],
+            data={
+                'id': row['id'],
+                'tags': tags[row['id']],
+                'author': [
+                    row[f'author__{name}'] for name in AUTHOR_FIELDS
+                ],
+                'ingredients': ingredients[row['id']],
+                'name': row['name'],
+                'image': row['image'],
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+            },
+        )
+        for row in rows
+    }
+
+
+def refresh_documents(recipe_ids):
+    """
+    Пересобрать документы в текущей транзакции.
+
+    Вызывается после записи самих рецептов: их строки уже заблокированы,
+    так что параллельная пересборка тех же документов ждёт коммита.
+    """
+    documents = build_documents(recipe_ids)
+    RecipeDocument.objects.filter(recipe__in=list(documents)).delete()
+    RecipeDocument.objects.bulk_create(documents.values())
+
+
+def repair_documents(missing_ids, stale_ids=()):
+    """
+    Rebuild missing and stale documents on read and return them.
+
+    The rows may come from a replica, so nothing fresher is overwritten:
+    missing documents are inserted ignoring conflicts and stale ones are
+    replaced only while their version is older than the rebuilt one.
+    """
+    documents = build_documents([*missing_ids, *stale_ids])
+    RecipeDocument.objects.bulk_create(
+        (documents[pk] for pk in missing_ids if pk in documents),
+        ignore_conflicts=True)
+    for pk in stale_ids:
+        document = documents.get(pk)
+        if document is None:
+            continue
+        RecipeDocument.objects.filter(
+            recipe=pk, recipe_updated_at__lt=document.recipe_updated_at,
+        ).update(data=document.data,
+                 recipe_updated_at=document.recipe_updated_at)
+    return documents
+
+
+def rebuild_chunk(recipe_ids):
+    """Пересобрать пачку документов, выполняется в процессе пула."""
+    with transaction.atomic():
+        list(
+            Recipe.all_objects.filter(pk__in=recipe_ids)
+            .select_for_update().values_list('pk', flat=True)
+        )
+        refresh_documents(recipe_ids)
+    return len(recipe_ids)
+
+
+def rebuild_documents(processes=None, chunk_size=REBUILD_CHUNK_SIZE):
+    """Пересобрать документы всех рецептов пачками по процессам."""
+    recipe_ids = list(
+        Recipe.objects.order_by('pk').values_list('pk', flat=True))
+    chunks = [
+        recipe_ids[start:start + chunk_size]
+        for start in range(0, len(recipe_ids), chunk_size)
+    ]
+    # Процессы открывают свои соединения, унаследованные закрыты.
+    connections.close_all()
+    with Pool(processes or os.cpu_count()) as pool:
+        return sum(pool.imap_unordered(rebuild_chunk, chunks))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from jobs.queue import job
+from recipes.constants import RANKINGS_REFRESH_MINUTES, SIMILAR_REBUILD_HOURS
+from recipes.deletion import purge
+from recipes.rankings import refresh_rankings
+from recipes.similarity import rebuild_similar_recipes, update_similar_recipes
+
+job('recipes.update_similar')(update_similar_recipes)
+
+
+@job('recipes.rebuild_similar',
+     periodic=timedelta(hours=SIMILAR_REBUILD_HOURS))
+def rebuild_similar():
+    """Воркер задач многопоточный, поэтому без пула процессов."""
+    return rebuild_similar_recipes(processes=1)
+
+
+job('recipes.refresh_rankings',
+    periodic=timedelta(minutes=RANKINGS_REFRESH_MINUTES))(refresh_rankings)
+
+job('recipes.purge')(purge)
@@ -4,11 +4,11 @@ from tqdm import tqdm
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
-from recipes.models import Ingredient, Tag
+from recipes.models import Ingredient, Tag, UnitConversion
 
 
 class Command(BaseCommand):
-    help = 'Downloading ingredients and tags.'
+    help = 'Downloading ingredients, tags and unit conversions.'
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.WARNING('Command start'))
@@ -26,4 +26,12 @@ class Command(BaseCommand):
             for tags in tqdm(tags_data):
                 Tag.objects.get_or_create(**tags)
 
+        with open(
+                f'{settings.BASE_DIR}/data/units.json',
+                encoding='utf-8') as data_file_units:
+            units_data = json.loads(data_file_units.read())
+            for conversion in tqdm(units_data):
+                UnitConversion.objects.update_or_create(
+                    unit=conversion.pop('unit'), defaults=conversion)
+
         self.stdout.write(self.style.SUCCESS('Данные загружены'))
@@ -0,0 +1,23 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from recipes.documents import REBUILD_CHUNK_SIZE, rebuild_documents
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed document of every recipe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Number of worker processes, all cores by default.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+            help='Recipes rebuilt in one transaction.')
+
+    def handle(self, *args, **options):
+        count = rebuild_documents(
+            options['processes'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Документы пересобраны: {count} рецептов'))
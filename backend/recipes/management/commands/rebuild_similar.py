@@ -0,0 +1,24 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import REBUILD_CHUNK_SIZE, rebuild_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'Recompute similar recipes for every recipe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Number of worker processes, all cores by default.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+            help='Matrix rows handled by a worker at a time.')
+
+    def handle(self, *args, **options):
+        recipes, pairs = rebuild_similar_recipes(
+            options['processes'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны: {recipes} рецептов, '
+            f'{pairs} пар'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipes.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = 'Refresh the daily rollup and popular/trending scores.'
+
+    def handle(self, *args, **options):
+        count = refresh_rankings()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги обновлены: {count} рецептов'))
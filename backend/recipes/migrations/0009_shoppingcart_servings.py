@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-19 09:19
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_unitconversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='servings',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(limit_value=1, message='Минимальный множитель 1!'), django.core.validators.MaxValueValidator(limit_value=100, message='Максимальный множитель 100!')], verbose_name='Множитель порций'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipedocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='created',
+            field=models.BooleanField(default=False, verbose_name='Создан'),
+        ),
+    ]
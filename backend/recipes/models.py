@@ -3,7 +3,8 @@ from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.db.models.functions import Length
 
-from recipes.constants import MAX_HEX, MAX_LEN_TITLE, MAX_AMOUNT, MIN_AMOUNT
+from recipes.constants import (MAX_AMOUNT, MAX_HEX, MAX_LEN_KIND,
+                               MAX_LEN_TITLE, MAX_SERVINGS, MIN_AMOUNT)
 from users.models import User
 
 
@@ -67,6 +68,43 @@ class Tag(models.Model):
         return self.name
 
 
+class UnitConversion(models.Model):
+    """
+    Conversion of a measurement unit to a canonical one:
+    amount in `canonical_unit` = amount in `unit` * `factor`.
+    """
+
+    unit = models.CharField(
+        verbose_name='Единица измерения',
+        max_length=MAX_LEN_TITLE,
+        unique=True,
+    )
+    canonical_unit = models.CharField(
+        verbose_name='Основная единица',
+        max_length=MAX_LEN_TITLE,
+    )
+    factor = models.PositiveIntegerField(
+        verbose_name='Множитель',
+        validators=[MinValueValidator(limit_value=MIN_AMOUNT)],
+    )
+
+    class Meta:
+        ordering = ('canonical_unit', 'factor')
+        verbose_name = 'Перевод единиц'
+        verbose_name_plural = 'Переводы единиц'
+
+    def __str__(self):
+        return '1 {} = {} {}'.format(
+            self.unit, self.factor, self.canonical_unit)
+
+
+class VisibleRecipeManager(models.Manager):
+    """Рецепты, кроме скрытых в ожидании фонового удаления."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Recipe(models.Model):
     """Recipe abstract model."""
 
@@ -97,6 +135,11 @@ class Recipe(models.Model):
         auto_now_add=True,
         editable=False,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+        db_index=True,
+    )
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='recipes/',
@@ -115,6 +158,15 @@ class Recipe(models.Model):
                 message=f'Превысили максимальное время {MAX_AMOUNT} минут!'),
         ],
     )
+    deleted_at = models.DateTimeField(
+        verbose_name='Скрыт для удаления',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    objects = VisibleRecipeManager()
+    all_objects = models.Manager()
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -187,6 +239,11 @@ class UserRecipeRelation(models.Model):
         on_delete=models.CASCADE,
         related_name='%(app_label)s_%(class)s_related',
     )
+    created_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         abstract = True
@@ -214,6 +271,278 @@ class Favorite(UserRecipeRelation):
 class ShoppingCart(UserRecipeRelation):
     """Model for shopping cart."""
 
+    servings = models.PositiveSmallIntegerField(
+        verbose_name='Множитель порций',
+        default=1,
+        validators=[
+            MinValueValidator(
+                limit_value=MIN_AMOUNT,
+                message=f'Минимальный множитель {MIN_AMOUNT}!'),
+            MaxValueValidator(
+                limit_value=MAX_SERVINGS,
+                message=f'Максимальный множитель {MAX_SERVINGS}!'),
+        ],
+    )
+
     class Meta(UserRecipeRelation.Meta):
         verbose_name = 'Cписок покупок'
         verbose_name_plural = 'Cписоки покупок'
+
+
+class SimilarRecipe(models.Model):
+    """Precomputed nearest neighbours of a recipe (see recipes.similarity)."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+    )
+    score = models.FloatField(
+        verbose_name='Сходство',
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe',
+            ),
+        )
+
+    def __str__(self):
+        return '{} ~ {}'.format(self.recipe_id, self.similar_id)
+
+
+class RecipeDailyStats(models.Model):
+    """Daily rollup of favorites and shopping cart additions of a recipe."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+    )
+    date = models.DateField(
+        verbose_name='День',
+        db_index=True,
+    )
+    favorites = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное',
+        default=0,
+    )
+    shopping_carts = models.PositiveIntegerField(
+        verbose_name='Добавлений в список покупок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Статистика рецепта за день'
+        verbose_name_plural = 'Статистика рецептов по дням'
+        ordering = ('-date',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'date'),
+                name='unique_recipe_daily_stats',
+            ),
+        )
+
+    def __str__(self):
+        return '{} {}'.format(self.recipe_id, self.date)
+
+
+class RecipeRanking(models.Model):
+    """Precomputed scores for ordering=popular|trending."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+    )
+    popular = models.FloatField(
+        verbose_name='Популярность',
+        default=0,
+        db_index=True,
+    )
+    trending = models.FloatField(
+        verbose_name='Тренд',
+        default=0,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class RecipeDocument(models.Model):
+    """
+    Reader-independent part of the recipe JSON (see recipes.documents).
+
+    `recipe_updated_at` is the Recipe.updated_at the document was built
+    from; a document with another value is stale.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+    )
+    data = models.JSONField(
+        verbose_name='Документ',
+    )
+    recipe_updated_at = models.DateTimeField(
+        verbose_name='Версия рецепта',
+    )
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class Change(models.Model):
+    """
+    Append-only change log for delta sync (GET /api/changes/).
+
+    Rows are written by recipes.signals inside the transaction of the
+    change itself; `owner_id` marks events visible only to one user,
+    `created` the first save of the object. A refresh of the rankings is
+    one RANKING row with object_id 0, a deleted token (logout) a TOKEN row
+    with the id of its user.
+    """
+
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    USER = 'user'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    RANKING = 'ranking'
+    TOKEN = 'token'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (TAG, 'Тег'),
+        (INGREDIENT, 'Ингредиент'),
+        (USER, 'Пользователь'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+        (SUBSCRIPTION, 'Подписка'),
+        (RANKING, 'Рейтинги'),
+        (TOKEN, 'Токен'),
+    )
+
+    created_at = models.DateTimeField(
+        verbose_name='Время',
+        auto_now_add=True,
+    )
+    kind = models.CharField(
+        verbose_name='Тип',
+        max_length=MAX_LEN_KIND,
+        choices=KINDS,
+    )
+    object_id = models.PositiveIntegerField(
+        verbose_name='id объекта',
+    )
+    deleted = models.BooleanField(
+        verbose_name='Удалён',
+        default=False,
+    )
+    created = models.BooleanField(
+        verbose_name='Создан',
+        default=False,
+    )
+    owner_id = models.PositiveIntegerField(
+        verbose_name='id владельца',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        ordering = ('pk',)
+
+    def __str__(self):
+        return '{} {} {}'.format(self.pk, self.kind, self.object_id)
+
+
+class Deletion(models.Model):
+    """
+    Background deletion of a recipe or a user (see recipes.deletion).
+
+    The object is hidden when the row is created; `deleted` counts the
+    rows removed so far out of `total`, which is counted by the first run.
+    """
+
+    RECIPE = 'recipe'
+    USER = 'user'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (USER, 'Пользователь'),
+    )
+
+    kind = models.CharField(
+        verbose_name='Тип',
+        max_length=MAX_LEN_KIND,
+        choices=KINDS,
+    )
+    object_id = models.PositiveIntegerField(
+        verbose_name='id объекта',
+    )
+    title = models.CharField(
+        verbose_name='Объект',
+        max_length=MAX_LEN_TITLE,
+    )
+    total = models.PositiveIntegerField(
+        verbose_name='Всего строк',
+        null=True,
+        blank=True,
+    )
+    deleted = models.PositiveIntegerField(
+        verbose_name='Удалено строк',
+        default=0,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Создано',
+        auto_now_add=True,
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='Завершено',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Удаление'
+        verbose_name_plural = 'Удаления'
+        ordering = ('-created_at',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('kind', 'object_id'),
+                condition=models.Q(finished_at__isnull=True),
+                name='unique_unfinished_deletion',
+            ),
+        )
+
+    def __str__(self):
+        return '{} {}'.format(self.get_kind_display(), self.title)
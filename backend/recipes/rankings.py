@@ -0,0 +1,86 @@
+"""
+Popular and trending scores of recipes.
+
+`refresh_rankings` is meant to run periodically: it re-aggregates the
+daily rollup for the last TRENDING_DAYS days and rewrites RecipeRanking,
+so ordering by a score reads one joined table instead of aggregating
+favorites and shopping carts per request.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.dispatch import Signal
+from django.utils import timezone
+
+from recipes.constants import TRENDING_DAYS, TRENDING_HALF_LIFE_DAYS
+from recipes.models import (Favorite, RecipeDailyStats, RecipeRanking,
+                            ShoppingCart)
+
+rankings_refreshed = Signal()
+
+
+def rollup(since):
+    """Пересчитать дневную статистику, начиная с дня since."""
+    start = timezone.make_aware(datetime.combine(since, time.min))
+    counts = defaultdict(lambda: [0, 0])
+    for index, model in enumerate((Favorite, ShoppingCart)):
+        rows = (
+            model.objects
+            .filter(created_at__gte=start)
+            .annotate(day=TruncDate('created_at'))
+            .values_list('recipe_id', 'day')
+            .annotate(count=Count('pk'))
+            .order_by()
+        )
+        for recipe_id, day, count in rows:
+            counts[recipe_id, day][index] = count
+    with transaction.atomic():
+        RecipeDailyStats.objects.filter(date__gte=since).delete()
+        RecipeDailyStats.objects.bulk_create(
+            (
+                RecipeDailyStats(recipe_id=recipe_id, date=day,
+                                 favorites=favorites,
+                                 shopping_carts=shopping_carts)
+                for (recipe_id, day), (favorites, shopping_carts)
+                in counts.items()
+            ),
+            batch_size=1000,
+        )
+
+
+def refresh_rankings():
+    """
+    Popular is the current number of favorites and shopping cart rows,
+    trending sums the recent daily rollup with an exponential decay.
+    """
+    today = timezone.localdate()
+    since = today - timedelta(days=TRENDING_DAYS - 1)
+    rollup(since)
+    popular = Counter()
+    for model in (Favorite, ShoppingCart):
+        popular.update(dict(
+            model.objects.values_list('recipe_id')
+            .annotate(count=Count('pk')).order_by()
+        ))
+    trending = Counter()
+    rows = RecipeDailyStats.objects.filter(date__gte=since).values_list(
+        'recipe_id', 'date', 'favorites', 'shopping_carts')
+    for recipe_id, day, favorites, shopping_carts in rows:
+        decay = 0.5 ** ((today - day).days / TRENDING_HALF_LIFE_DAYS)
+        trending[recipe_id] += (favorites + shopping_carts) * decay
+    with transaction.atomic():
+        RecipeRanking.objects.all().delete()
+        RecipeRanking.objects.bulk_create(
+            (
+                RecipeRanking(recipe_id=recipe_id,
+                              popular=popular[recipe_id],
+                              trending=trending[recipe_id])
+                for recipe_id in popular.keys() | trending.keys()
+            ),
+            batch_size=1000,
+        )
+        rankings_refreshed.send(sender=RecipeRanking)
+    return len(popular.keys() | trending.keys())
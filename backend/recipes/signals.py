@@ -0,0 +1,127 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.deletion import recipes_hidden
+from recipes.documents import refresh_documents
+from recipes.models import (AmountIngredient, Change, Favorite, Ingredient,
+                            Recipe, ShoppingCart, Tag)
+from recipes.rankings import rankings_refreshed
+from users.models import Subscription, User
+
+
+def record_changes(kind, object_ids, deleted=False, owner_id=None,
+                   created=False):
+    """Дописать события в журнал изменений в текущей транзакции."""
+    Change.objects.bulk_create(
+        Change(kind=kind, object_id=object_id, deleted=deleted,
+               owner_id=owner_id, created=created)
+        for object_id in object_ids
+    )
+
+
+def touch_recipes(refresh=False, **lookup):
+    """
+    Обновить updated_at рецептов, чьё представление изменилось.
+
+    С refresh документы рецептов пересобираются тут же; без него (до
+    удаления связи) они считаются устаревшими до чтения.
+    """
+    recipes = Recipe.objects.filter(**lookup)
+    recipe_ids = list(recipes.values_list('pk', flat=True))
+    record_changes(Change.RECIPE, recipe_ids)
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+    if refresh and recipe_ids:
+        refresh_documents(recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=User)
+def object_changed(sender, instance, signal, update_fields=None,
+                   created=False, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    record_changes(
+        sender._meta.model_name, [instance.pk],
+        deleted=signal is post_delete, created=created)
+
+
+@receiver(recipes_hidden)
+def recipes_hidden_changed(sender, recipe_ids, **kwargs):
+    """Для клиентов скрытый рецепт уже удалён."""
+    record_changes(Change.RECIPE, recipe_ids, deleted=True)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def user_recipe_changed(sender, instance, signal, **kwargs):
+    kind = Change.FAVORITE if sender is Favorite else Change.SHOPPING_CART
+    record_changes(kind, [instance.recipe_id],
+                   deleted=signal is post_delete, owner_id=instance.user_id)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscription_changed(sender, instance, signal, **kwargs):
+    record_changes(Change.SUBSCRIPTION, [instance.author_id],
+                   deleted=signal is post_delete, owner_id=instance.user_id)
+
+
+@receiver(rankings_refreshed)
+def rankings_changed(sender, **kwargs):
+    """Порядок рецептов изменился для всех процессов."""
+    record_changes(Change.RANKING, [0])
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Выход должен дойти до кешей аутентификации всех процессов."""
+    record_changes(Change.TOKEN, [instance.user_id], deleted=True)
+
+
+@receiver(post_save, sender=AmountIngredient)
+@receiver(post_delete, sender=AmountIngredient)
+def amount_ingredient_changed(sender, instance, **kwargs):
+    touch_recipes(pk=instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            touch_recipes(pk=instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        touch_recipes(refresh=True, pk__in=pk_set)
+    elif action == 'pre_clear':
+        touch_recipes(pk__in=instance.recipes.values('pk'))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, signal, **kwargs):
+    touch_recipes(refresh=signal is post_save, tags=instance)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, signal, **kwargs):
+    touch_recipes(refresh=signal is post_save, ingredients=instance)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    touch_recipes(refresh=True, author=instance)
@@ -0,0 +1,231 @@
+"""
+Similar recipes by ingredient and tag overlap.
+
+Each recipe is a sparse vector over ingredients (weight 1) and tags
+(weight SIMILAR_TAG_WEIGHT); the score is the cosine of two vectors and
+only recipes sharing an ingredient are scored, tags alone would relate
+almost every pair.
+The best SIMILAR_RECIPES_LIMIT neighbours are stored in SimilarRecipe:
+`rebuild_similar_recipes` recomputes all of them from a CSR matrix,
+`update_similar_recipes` refreshes one recipe after it was saved.
+"""
+import heapq
+import math
+import os
+from collections import defaultdict
+from multiprocessing import Pool
+
+from django.db import transaction
+
+from recipes.constants import SIMILAR_RECIPES_LIMIT, SIMILAR_TAG_WEIGHT
+from recipes.models import AmountIngredient, Recipe, SimilarRecipe
+
+REBUILD_CHUNK_SIZE = 1000
+SCORE_DIGITS = 6
+
+matrix = None
+
+
+def load_features(recipe_ids=None):
+    """Словари рецепт -> множество ингредиентов и рецепт -> теги."""
+    ingredients = defaultdict(set)
+    tags = defaultdict(set)
+    ingredient_rows = AmountIngredient.objects.order_by()
+    tag_rows = Recipe.tags.through.objects.order_by()
+    if recipe_ids is not None:
+        ingredient_rows = ingredient_rows.filter(recipe_id__in=recipe_ids)
+        tag_rows = tag_rows.filter(recipe_id__in=recipe_ids)
+    for recipe_id, ingredient_id in ingredient_rows.values_list(
+            'recipe_id', 'ingredient_id'):
+        ingredients[recipe_id].add(ingredient_id)
+    for recipe_id, tag_id in tag_rows.values_list('recipe_id', 'tag_id'):
+        tags[recipe_id].add(tag_id)
+    return ingredients, tags
+
+
+def norm(ingredients, tags):
+    return math.sqrt(len(ingredients) + len(tags) * SIMILAR_TAG_WEIGHT ** 2)
+
+
+def similarity(ingredients, tags, other_ingredients, other_tags):
+    """Косинус двух рецептов, тот же, что даёт матрица при rebuild."""
+    denominator = (
+        norm(ingredients, tags) * norm(other_ingredients, other_tags))
+    if not denominator:
+        return 0.0
+    dot = (
+        len(ingredients & other_ingredients)
+        + len(tags & other_tags) * SIMILAR_TAG_WEIGHT ** 2
+    )
+    return dot / denominator
+
+
+def top_similar(scores, limit=SIMILAR_RECIPES_LIMIT):
+    """Лучшие (id, score) по убыванию сходства, при равенстве — новые."""
+    return heapq.nlargest(
+        limit,
+        (
+            (recipe_id, round(score, SCORE_DIGITS))
+            for recipe_id, score in scores.items() if score
+        ),
+        key=lambda item: (item[1], item[0]),
+    )
+
+
+def update_similar_recipes(recipe_id):
+    """
+    Recompute the neighbours of one recipe and put it into the lists of
+    the recipes sharing an ingredient with it.
+
+    A list that loses the recipe keeps one neighbour less until the next
+    full rebuild.
+    """
+    ingredients, tags = load_features([recipe_id])
+    ingredients, tags = ingredients[recipe_id], tags[recipe_id]
+    candidates = set(
+        AmountIngredient.objects
+        .filter(ingredient_id__in=ingredients)
+        .exclude(recipe_id=recipe_id)
+        .values_list('recipe_id', flat=True)
+    )
+    other_ingredients, other_tags = load_features(candidates)
+    scores = {
+        candidate: similarity(
+            ingredients, tags,
+            other_ingredients[candidate], other_tags[candidate])
+        for candidate in candidates
+    }
+    stored = defaultdict(dict)
+    rows = SimilarRecipe.objects.filter(
+        recipe_id__in=candidates | set(
+            SimilarRecipe.objects.filter(similar_id=recipe_id)
+            .values_list('recipe_id', flat=True)
+        )
+    ).values_list('recipe_id', 'similar_id', 'score')
+    for owner_id, similar_id, score in rows:
+        stored[owner_id][similar_id] = score
+    changed = {recipe_id: dict(top_similar(scores))}
+    for owner_id, neighbours in stored.items():
+        updated = dict(neighbours)
+        updated.pop(recipe_id, None)
+        if scores.get(owner_id):
+            updated[recipe_id] = scores[owner_id]
+        updated = dict(top_similar(updated))
+        if updated != neighbours:
+            changed[owner_id] = updated
+    for owner_id in candidates - stored.keys():
+        if scores[owner_id]:
+            changed[owner_id] = {recipe_id: scores[owner_id]}
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=changed).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=owner_id, similar_id=similar_id,
+                          score=score)
+            for owner_id, neighbours in changed.items()
+            for similar_id, score in neighbours.items()
+        )
+
+
+def build_matrix():
+    """
+    Row-normalized CSR matrices recipe x ingredients and recipe x tags:
+    together they are the recipe vectors, split so that only recipes
+    sharing an ingredient are scored.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    ingredients, tags = load_features()
+    recipe_ids = sorted(Recipe.objects.values_list('pk', flat=True))
+    parts = []
+    for features, weight in ((ingredients, 1.0), (tags, SIMILAR_TAG_WEIGHT)):
+        columns = {}
+        rows, cols = [], []
+        for row, recipe_id in enumerate(recipe_ids):
+            for pk in features[recipe_id]:
+                rows.append(row)
+                cols.append(columns.setdefault(pk, len(columns)))
+        parts.append(sparse.csr_matrix(
+            (np.full(len(rows), weight), (rows, cols)),
+            shape=(len(recipe_ids), len(columns)),
+        ))
+    norms = np.sqrt(sum(
+        np.asarray(part.multiply(part).sum(axis=1)).ravel()
+        for part in parts
+    ))
+    norms[norms == 0] = 1.0
+    scale = sparse.diags(1 / norms)
+    return recipe_ids, tuple((scale @ part).tocsr() for part in parts)
+
+
+def set_matrix(value):
+    global matrix
+    matrix = value
+
+
+def top_similar_rows(bounds):
+    """
+    Neighbours of the matrix rows [start, stop), runs in a pool process.
+
+    Candidates are the recipes sharing an ingredient, as in the
+    incremental update; the tag part is added to their scores only, so a
+    block stays as sparse as the ingredient overlap. Rows are numbered in
+    recipe id order, so ranking them with top_similar gives the same ties.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    start, stop = bounds
+    ingredients, tags = matrix
+    block = (ingredients[start:stop] @ ingredients.T).tocoo()
+    shared_tags = np.asarray(
+        tags[block.row + start].multiply(tags[block.col]).sum(axis=1)
+    ).ravel()
+    block = sparse.csr_matrix(
+        (block.data + shared_tags, (block.row, block.col)),
+        shape=block.shape)
+    result = []
+    for offset in range(stop - start):
+        row = start + offset
+        begin, end = block.indptr[offset], block.indptr[offset + 1]
+        scores = dict(zip(
+            block.indices[begin:end].tolist(),
+            block.data[begin:end].tolist(),
+        ))
+        scores.pop(row, None)
+        result.append((row, top_similar(scores)))
+    return result
+
+
+def rebuild_similar_recipes(processes=None, chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Recompute the neighbours of every recipe, the matrix split across
+    processes. With processes=1 the chunks run in this process: a fork
+    from a threaded process (the jobs worker) may copy a held lock.
+    """
+    recipe_ids, value = build_matrix()
+    chunks = [
+        (start, min(start + chunk_size, len(recipe_ids)))
+        for start in range(0, len(recipe_ids), chunk_size)
+    ]
+    if processes == 1:
+        set_matrix(value)
+        try:
+            results = list(map(top_similar_rows, chunks))
+        finally:
+            set_matrix(None)
+    else:
+        with Pool(processes or os.cpu_count(), set_matrix,
+                  (value,)) as pool:
+            results = pool.map(top_similar_rows, chunks)
+    objects = [
+        SimilarRecipe(recipe_id=recipe_ids[row], similar_id=recipe_ids[col],
+                      score=score)
+        for chunk in results
+        for row, neighbours in chunk
+        for col, score in neighbours
+    ]
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        SimilarRecipe.objects.bulk_create(objects, batch_size=1000)
+    return len(recipe_ids), len(objects)
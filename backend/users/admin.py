@@ -1,9 +1,16 @@
 from django.contrib import admin
 
+from recipes.admin import BackgroundDeletionAdmin
+from recipes.deletion import delete_user
+from recipes.models import Deletion
+
 from .models import User
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'username', 'first_name', 'last_name', 'email')
+class UserAdmin(BackgroundDeletionAdmin):
+    list_display = (
+        'pk', 'username', 'first_name', 'last_name', 'email', 'is_active')
     search_fields = ('username', 'email',)
+    deletion_function = staticmethod(delete_user)
+    deletion_kind = Deletion.USER